@@ -0,0 +1,21 @@
+import logging
+
+from django.conf import settings
+from django.db.transaction import atomic
+from django.core.management.base import BaseCommand
+
+from wrapper.models import Ledger, LedgerSummary, invalidate_ledgers_index
+
+
+class Command(BaseCommand):
+
+    help = 'Rebuild ledgers summaries (one-off, call it after TMTM path settings changes)'
+
+    def handle(self, *args, **options):
+        queryset = Ledger.objects.filter(entity=settings.AGENT['entity']).order_by('id').all()
+        logging.error('* rebuild summaries for %d ledgers' % queryset.count())
+        for ledger in queryset.iterator():
+            with atomic():
+                LedgerSummary.refresh(ledger)
+        invalidate_ledgers_index()
+        logging.error('* summaries was rebuilt')
@@ -0,0 +1,107 @@
+import time
+import asyncio
+import logging
+from typing import Callable, Awaitable, Iterable, List
+
+from scripts.management.commands.locks import KeyedLock
+
+
+class Dispatcher:
+    """Bounded pool of workers that process events received by listener.
+
+    Listener submits jobs and waits while queue_size jobs are not taken by workers yet (backpressure).
+    Jobs with same key (ledger name) are started in order of submission and never run
+    simultaneously (see KeyedLock), jobs with different keys run in parallel.
+    Job is handed to workers only when its keys are free, so burst of events for one ledger
+    waits in queue and doesn't occupy workers needed by other ledgers.
+    """
+
+    def __init__(self, concurrency: int, queue_size: int, locks: KeyedLock = None):
+        self.__concurrency = concurrency
+        self.__queue_size = queue_size
+        self.__slots = asyncio.Semaphore(queue_size)
+        self.__ready = asyncio.Queue()
+        self.__workers: List[asyncio.Future] = []
+        self.__locks = locks or KeyedLock()
+        self.__queued = 0
+        self.__running = 0
+        self.__idle = asyncio.Event()
+        self.__idle.set()
+        self.__stopped = False
+        self.__counters = dict(submitted=0, processed=0, errors=0)
+        self.__queue_time = 0.0
+        self.__processing_time = 0.0
+
+    def start(self):
+        while len(self.__workers) < self.__concurrency:
+            self.__workers.append(asyncio.ensure_future(self.__worker()))
+
+    async def stop(self, timeout: float = None):
+        """Stop taking jobs, wait while submitted jobs are processed, then cancel workers
+
+        :param timeout: max time to wait for submitted jobs, jobs not processed in time are cancelled
+        """
+        self.__stopped = True
+        try:
+            await asyncio.wait_for(self.__idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logging.error('Dispatcher: %d jobs are cancelled on stop' % (self.__queued + self.__running))
+        for worker in self.__workers:
+            worker.cancel()
+        await asyncio.gather(*self.__workers, return_exceptions=True)
+        self.__workers.clear()
+
+    async def submit(self, job: Callable[[], Awaitable], keys: Iterable[str] = ()):
+        """Schedule job, wait if queue is full
+
+        :param job: coroutine function without arguments
+        :param keys: ordering keys, jobs sharing any key are processed one by one
+        """
+        if self.__stopped:
+            raise RuntimeError('Dispatcher is stopped')
+        await self.__slots.acquire()
+        if self.__stopped:
+            self.__slots.release()
+            raise RuntimeError('Dispatcher is stopped')
+        guard = self.__locks.reserve(keys)
+        self.__counters['submitted'] += 1
+        self.__queued += 1
+        self.__idle.clear()
+        item = (job, guard, time.monotonic())
+        guard.ready().add_done_callback(lambda _: self.__ready.put_nowait(item))
+
+    def metrics(self) -> dict:
+        processed = self.__counters['processed'] + self.__counters['errors']
+        return dict(
+            concurrency=self.__concurrency,
+            queue_depth=self.__queued,
+            queue_size=self.__queue_size,
+            ready=self.__ready.qsize(),
+            running=self.__running,
+            locks=self.__locks.metrics(),
+            avg_queue_ms=round(1000 * self.__queue_time / processed, 2) if processed else 0,
+            avg_processing_ms=round(1000 * self.__processing_time / processed, 2) if processed else 0,
+            **self.__counters
+        )
+
+    async def __worker(self):
+        while True:
+            job, guard, stamp = await self.__ready.get()
+            self.__queued -= 1
+            self.__slots.release()
+            self.__running += 1
+            self.__queue_time += time.monotonic() - stamp
+            started = time.monotonic()
+            try:
+                # keys are free already, guard is entered without waiting
+                async with guard:
+                    await job()
+                    self.__counters['processed'] += 1
+            except Exception as e:
+                self.__counters['errors'] += 1
+                logging.error('Dispatcher: job terminated with exception: ' + repr(e))
+            finally:
+                self.__running -= 1
+                self.__processing_time += time.monotonic() - started
+                if not self.__queued and not self.__running:
+                    self.__idle.set()
@@ -0,0 +1,50 @@
+import csv
+import json
+import asyncio
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ui.views import UserImportView
+from wrapper.pool import get_agent_pool
+
+
+class Command(BaseCommand):
+
+    help = 'Import accounts from CSV (header: username,password,first_name,last_name) or JSON list'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=str)
+
+    def handle(self, *args, **options):
+        if not settings.AGENT['entity']:
+            raise CommandError('Agent entity is not set')
+        accounts = self.load_accounts(options['path'])
+        processed = []
+
+        def on_progress(result: dict):
+            processed.append(result)
+            if result['success']:
+                print('[%d/%d] %s: created' % (len(processed), len(accounts), result['username']))
+            else:
+                print('[%d/%d] %s: %s' % (len(processed), len(accounts), result['username'], result['errors']))
+
+        loop = asyncio.get_event_loop()
+        try:
+            results = loop.run_until_complete(UserImportView.provision_accounts(accounts, on_progress))
+        finally:
+            # pool of command loop is not reused after import, don't leave agent connections opened
+            loop.run_until_complete(get_agent_pool().close())
+        data = UserImportView.build_response_data(results)
+        print('===================================')
+        print('Accounts created: %d, failed: %d' % (data['created'], data['failed']))
+        print('===================================')
+
+    @staticmethod
+    def load_accounts(path: str) -> list:
+        with open(path, newline='') as f:
+            if path.endswith('.json'):
+                return UserImportView.load_accounts(json.load(f))
+            else:
+                # empty columns are treated as missing
+                return [{k: v for k, v in row.items() if v} for row in csv.DictReader(f)]
@@ -0,0 +1,92 @@
+import time
+import asyncio
+from typing import Iterable, Dict, List
+
+
+class KeyedLock:
+    """FIFO async locks by key (ledger name).
+
+    Place in queue of every key is reserved synchronously by reserve(), so order of
+    reservations is order of execution for same key, and set of keys is taken at once
+    without deadlocks. Different keys don't block each other.
+
+        guard = locks.reserve(['ledger-1', 'ledger-2'])
+        async with guard:
+            ...
+    """
+
+    def __init__(self):
+        self.__tails: Dict[str, asyncio.Future] = {}
+        self.__counters = dict(acquired=0, contended=0)
+        self.__wait_time = 0.0
+        self.__max_wait_time = 0.0
+
+    def reserve(self, keys: Iterable[str]) -> 'KeyedLockGuard':
+        keys = set(keys)
+        done = asyncio.get_event_loop().create_future()
+        predecessors = [self.__tails[key] for key in keys if key in self.__tails]
+        for key in keys:
+            self.__tails[key] = done
+        return KeyedLockGuard(self, keys, predecessors, done)
+
+    def metrics(self) -> dict:
+        acquired = self.__counters['acquired']
+        return dict(
+            locked_keys=len(self.__tails),
+            avg_wait_ms=round(1000 * self.__wait_time / acquired, 2) if acquired else 0,
+            max_wait_ms=round(1000 * self.__max_wait_time, 2),
+            **self.__counters
+        )
+
+    def _on_acquired(self, wait_time: float, contended: bool):
+        self.__counters['acquired'] += 1
+        if contended:
+            self.__counters['contended'] += 1
+        self.__wait_time += wait_time
+        self.__max_wait_time = max(self.__max_wait_time, wait_time)
+
+    def _on_released(self, keys: set, done: asyncio.Future):
+        for key in keys:
+            if self.__tails.get(key) is done:
+                del self.__tails[key]
+        if not done.done():
+            done.set_result(None)
+
+
+class KeyedLockGuard:
+
+    def __init__(self, owner: KeyedLock, keys: set, predecessors: List[asyncio.Future], done: asyncio.Future):
+        self.__owner = owner
+        self.__keys = keys
+        self.__predecessors = predecessors
+        self.__done = done
+
+    async def __aenter__(self):
+        stamp = time.monotonic()
+        try:
+            if self.__predecessors:
+                await asyncio.wait(self.__predecessors)
+        except:
+            self.release()
+            raise
+        self.__owner._on_acquired(time.monotonic() - stamp, contended=bool(self.__predecessors))
+        self.__predecessors = []
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+    def ready(self) -> asyncio.Future:
+        """Future that is done when predecessors released keys, so entering guard doesn't wait"""
+        return asyncio.gather(*self.__predecessors)
+
+    def release(self):
+        """Release keys, successors may proceed. Call it directly if guard was never entered"""
+        pending = [fut for fut in self.__predecessors if not fut.done()]
+        if pending:
+            # guard gives up its turn, successors still have to wait for predecessors
+            asyncio.gather(*pending).add_done_callback(
+                lambda _: self.__owner._on_released(self.__keys, self.__done)
+            )
+        else:
+            self.__owner._on_released(self.__keys, self.__done)
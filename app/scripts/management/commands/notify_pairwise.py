@@ -26,27 +26,31 @@ class Command(BaseCommand):
         message = options['message']
 
         async def run(theirs: List[str]):
-
-            async def process_pairwise(their_did: str):
-                to = await sirius_sdk.PairwiseList.load_for_did(their_did)
-                if to:
-                    question = sirius_sdk.aries_rfc.Question(
-                        valid_responses=[self.STATISTIC_TEXT, self.UNSUBSCRIBE_TEXT],
-                        question_text='Новое событие',
-                        question_detail=message
-                    )
-                    question.set_ttl(60)
-                    success, answer = await sirius_sdk.aries_rfc.ask_and_wait_answer(question, to)
-                    if success and isinstance(answer, sirius_sdk.aries_rfc.Answer):
-                        await self.process_answer(answer, to)
-
-            coros = [process_pairwise(did) for did in theirs]
+            coros = [self.notify(did, message) for did in theirs]
             await asyncio.wait(coros, timeout=120, return_when=asyncio.ALL_COMPLETED)
 
-        dids = [rec.their_did for rec in PairwiseRecord.objects.filter(subscribe=True).all()]
+        dids = self.load_subscribers()
         if dids:
             asyncio.get_event_loop().run_until_complete(run(dids))
 
+    @staticmethod
+    def load_subscribers() -> List[str]:
+        return [rec.their_did for rec in PairwiseRecord.objects.filter(subscribe=True).all()]
+
+    @classmethod
+    async def notify(cls, their_did: str, message: str):
+        to = await sirius_sdk.PairwiseList.load_for_did(their_did)
+        if to:
+            question = sirius_sdk.aries_rfc.Question(
+                valid_responses=[cls.STATISTIC_TEXT, cls.UNSUBSCRIBE_TEXT],
+                question_text='Новое событие',
+                question_detail=message
+            )
+            question.set_ttl(60)
+            success, answer = await sirius_sdk.aries_rfc.ask_and_wait_answer(question, to)
+            if success and isinstance(answer, sirius_sdk.aries_rfc.Answer):
+                await cls.process_answer(answer, to)
+
     @classmethod
     async def process_answer(cls, answer: sirius_sdk.aries_rfc.Answer, their: sirius_sdk.Pairwise):
 
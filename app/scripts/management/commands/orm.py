@@ -1,10 +1,26 @@
-from typing import List
+from typing import List, Dict
 
 from django.db.transaction import atomic
 from django.conf import settings
 from channels.db import database_sync_to_async
 
-from wrapper.models import Ledger, Transaction
+from wrapper.models import Ledger, Transaction, LedgerSummary
+
+
+def build_transactions(ledger: Ledger, transactions: List[dict], their_did: str = None) -> List[Transaction]:
+    models = []
+    for txn in transactions:
+        m = txn.pop('txnMetadata')
+        models.append(
+            Transaction(
+                ledger=ledger,
+                txn=txn,
+                seq_no=m.get('seqNo'),
+                metadata=m,
+                actor_entity=their_did
+            )
+        )
+    return models
 
 
 async def create_ledger(name: str, metadata: dict, genesis: List[dict]) -> int:
@@ -16,15 +32,8 @@ async def create_ledger(name: str, metadata: dict, genesis: List[dict]) -> int:
                 metadata=metadata_,
                 entity=settings.AGENT['entity'],
             )
-            with atomic():
-                for txn in genesis_:
-                    m = txn.pop('txnMetadata')
-                    t = Transaction.objects.create(
-                        ledger=ledger,
-                        txn=txn,
-                        seq_no=m.get('seqNo'),
-                        metadata=m
-                    )
+            Transaction.objects.bulk_create(build_transactions(ledger, genesis_))
+            LedgerSummary.refresh(ledger)
             return ledger.id
 
     return await database_sync_to_async(sync)(name, metadata, genesis)
@@ -39,18 +48,31 @@ async def reset_ledger(name: str):
 
 
 async def store_transactions(ledger: str, transactions: List[dict], their_did: str = None):
+    await store_transactions_batch({ledger: transactions}, their_did)
+
 
-    def sync(ledger_: str, transactions_: List[dict]):
-        ledger_model = Ledger.objects.get(name=ledger_, entity=settings.AGENT['entity'])
+async def store_transactions_batch(batches: Dict[str, List[dict]], their_did: str = None):
+    """Store transactions of several ledgers with single lookup and single bulk insert
+
+    :param batches: ledger name -> committed transactions
+    :param their_did: DID of actor that committed transactions
+    """
+
+    def sync(batches_: Dict[str, List[dict]]):
+        ledgers = {
+            ledger.name: ledger for ledger in Ledger.objects.filter(
+                name__in=list(batches_.keys()), entity=settings.AGENT['entity']
+            ).all()
+        }
+        missing = [name for name in batches_.keys() if name not in ledgers]
+        if missing:
+            raise Ledger.DoesNotExist('Ledgers do not exist: %s' % ', '.join(missing))
         with atomic():
-            for txn in transactions_:
-                m = txn.pop('txnMetadata')
-                t = Transaction.objects.create(
-                    ledger=ledger_model,
-                    txn=txn,
-                    seq_no=m.get('seqNo'),
-                    metadata=m,
-                    actor_entity=their_did
-                )
-
-    await database_sync_to_async(sync)(ledger, transactions)
+            models = []
+            for name, transactions in batches_.items():
+                models.extend(build_transactions(ledgers[name], transactions, their_did))
+            Transaction.objects.bulk_create(models)
+            for ledger in ledgers.values():
+                LedgerSummary.refresh(ledger)
+
+    await database_sync_to_async(sync)(batches)
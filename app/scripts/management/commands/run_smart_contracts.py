@@ -2,13 +2,14 @@ import json
 import logging
 import asyncio
 from time import sleep
+from functools import partial
 from datetime import datetime
 
 from channels.db import database_sync_to_async
 from django.core.management.base import BaseCommand
 from django.conf import settings
 from django.core.cache import cache
-from sirius_sdk import Agent, P2PConnection, Pairwise
+from sirius_sdk import Agent, Pairwise
 from sirius_sdk.agent.listener import Event
 from sirius_sdk.agent.ledger import CredentialDefinition
 from sirius_sdk.errors.exceptions import SiriusConnectionClosed
@@ -16,10 +17,14 @@ from sirius_sdk.agent.consensus import simple as simple_consensus
 
 from scripts.management.commands import orm
 from scripts.management.commands.decorators import sentry_capture_exceptions
+from scripts.management.commands.dispatcher import Dispatcher
 from scripts.management.commands.logger import StreamLogger
 
-from wrapper.models import GURecord
+from wrapper.models import GURecord, Token
 from wrapper.utils import get_agent_microledgers
+from wrapper.pool import get_connection, alloc_agent_connection, get_agent_pools_metrics
+from wrapper.health import run_health_monitor
+from ui.invitations import run_qr_pool_refiller
 
 
 def parse_and_store_gu(txn: dict, category: str):
@@ -79,37 +84,36 @@ class Command(BaseCommand):
                 logging.error(repr(e))
 
             logging.error('****** Run listener event-loop ******')
-            while True:
-                try:
-                    asyncio.get_event_loop().run_until_complete(self.run_listener())
-                except Exception as e:
-                    if isinstance(e, SiriusConnectionClosed):
-                        logging.error('Agent connection is finished, re-enter loop')
-                        sleep(1)
-                    else:
-                        logging.error(
-                            'EXCEPTION: exception was raised while process listener event loop. '
-                            'Loop will be restarted after %d secs' % self.loop_timeout
-                        )
-                        logging.error(repr(e))
-                        sleep(self.loop_timeout)
+            # dispatcher outlives listener restarts, so reconnect doesn't drop jobs in progress
+            dispatcher = Dispatcher(
+                concurrency=settings.SMART_CONTRACTS_CONCURRENCY,
+                queue_size=settings.SMART_CONTRACTS_QUEUE_SIZE
+            )
+            dispatcher.start()
+            try:
+                while True:
+                    try:
+                        asyncio.get_event_loop().run_until_complete(self.run_listener(dispatcher))
+                    except Exception as e:
+                        if isinstance(e, SiriusConnectionClosed):
+                            logging.error('Agent connection is finished, re-enter loop')
+                            sleep(1)
+                        else:
+                            logging.error(
+                                'EXCEPTION: exception was raised while process listener event loop. '
+                                'Loop will be restarted after %d secs' % self.loop_timeout
+                            )
+                            logging.error(repr(e))
+                            sleep(self.loop_timeout)
+            finally:
+                logging.error('* drain smart-contracts dispatcher')
+                asyncio.get_event_loop().run_until_complete(dispatcher.stop(timeout=self.loop_timeout))
         else:
             logging.error('****** Entity is empty, terminate ***********')
 
     @staticmethod
     def alloc_agent_connection() -> Agent:
-        agent = Agent(
-            server_address=settings.AGENT['server_address'],
-            credentials=settings.AGENT['credentials'].encode('ascii'),
-            p2p=P2PConnection(
-                my_keys=(
-                    settings.AGENT['my_verkey'],
-                    settings.AGENT['my_secret_key']
-                ),
-                their_verkey=settings.AGENT['agent_verkey']
-            )
-        )
-        return agent
+        return alloc_agent_connection()
 
     async def ensure_cred_def_exists(self):
         agent = self.alloc_agent_connection()
@@ -172,9 +176,13 @@ class Command(BaseCommand):
             logging.error('* agent.close()')
             await agent.close()
 
-    async def run_listener(self):
+    async def run_listener(self, dispatcher: Dispatcher):
         agent = self.alloc_agent_connection()
         await agent.open()
+        publisher = asyncio.ensure_future(self.publish_metrics(dispatcher))
+        purger = asyncio.ensure_future(self.purge_tokens())
+        health_monitor = asyncio.ensure_future(run_health_monitor())
+        qr_pool_refiller = asyncio.ensure_future(run_qr_pool_refiller())
         try:
             logging.error('* agent.subscribe()')
             listener = await agent.subscribe()
@@ -190,32 +198,66 @@ class Command(BaseCommand):
                     logging.error('* event.pairwise is filled')
                     if isinstance(event.message, simple_consensus.messages.InitRequestLedgerMessage):
                         logging.error('* init_ledger_accepting')
-                        fut = self.init_ledger_accepting(
-                            propose=event.message,
-                            p2p=event.pairwise
+                        await dispatcher.submit(
+                            partial(self.init_ledger_accepting, propose=event.message, p2p=event.pairwise),
+                            keys=[(event.message.ledger or {}).get('name')]
                         )
-                        asyncio.ensure_future(fut)
                     elif isinstance(event.message, simple_consensus.messages.ProposeTransactionsMessage):
                         logging.error('* accept_transactions')
-                        fut = self.accept_transactions(
-                            propose=event.message,
-                            p2p=event.pairwise
+                        await dispatcher.submit(
+                            partial(self.accept_transactions, propose=event.message, p2p=event.pairwise),
+                            keys=[(event.message.state or {}).get('name')]
                         )
-                        asyncio.ensure_future(fut)
                     elif isinstance(event.message, simple_consensus.messages.ProposeParallelTransactionsMessage):
                         logging.error('* accept_transactions')
-                        fut = self.accept_transactions_parallel(
-                            propose=event.message,
-                            p2p=event.pairwise
+                        await dispatcher.submit(
+                            partial(self.accept_transactions_parallel, propose=event.message, p2p=event.pairwise),
+                            keys=[batch.ledger_name for batch in event.message.transactions or []]
                         )
-                        asyncio.ensure_future(fut)
                     elif event.message.type == 'https://github.com/Sirius-social/TMTM/tree/master/transactions/1.0/gu-11':
-                        await database_sync_to_async(parse_and_store_gu)(event.message, 'gu11')
+                        await dispatcher.submit(
+                            partial(database_sync_to_async(parse_and_store_gu), event.message, 'gu11')
+                        )
                     elif event.message.type == 'https://github.com/Sirius-social/TMTM/tree/master/transactions/1.0/gu-12':
-                        await database_sync_to_async(parse_and_store_gu)(event.message, 'gu12')
+                        await dispatcher.submit(
+                            partial(database_sync_to_async(parse_and_store_gu), event.message, 'gu12')
+                        )
         finally:
+            publisher.cancel()
+            purger.cancel()
+            health_monitor.cancel()
+            qr_pool_refiller.cancel()
             await agent.close()
 
+    @staticmethod
+    async def publish_metrics(dispatcher: Dispatcher):
+        """Share metrics of smart-contracts process with web process through cache"""
+        while True:
+            await asyncio.sleep(settings.SMART_CONTRACTS_METRICS_INTERVAL)
+            metrics = dict(
+                dispatcher=dispatcher.metrics(),
+                agent_pools=get_agent_pools_metrics(),
+                stamp=str(datetime.utcnow())
+            )
+            try:
+                await database_sync_to_async(cache.set)(
+                    settings.SMART_CONTRACTS_METRICS_CACHE_KEY, metrics, 3*settings.SMART_CONTRACTS_METRICS_INTERVAL
+                )
+            except Exception as e:
+                logging.error('Exception while publish metrics: ' + repr(e))
+
+    @staticmethod
+    async def purge_tokens():
+        """Remove expired websocket tokens"""
+        while True:
+            try:
+                deleted = await database_sync_to_async(Token.purge_expired)()
+                if deleted:
+                    logging.error('* purged expired tokens: %d' % deleted)
+            except Exception as e:
+                logging.error('Exception while purge tokens: ' + repr(e))
+            await asyncio.sleep(settings.TOKEN_PURGE_INTERVAL)
+
     @sentry_capture_exceptions
     async def init_ledger_accepting(self, propose: simple_consensus.messages.InitRequestLedgerMessage, p2p: Pairwise):
         """Smart-Contract that implements logic of new ledger accepting.
@@ -225,9 +267,7 @@ class Command(BaseCommand):
         :param p2p: pairwise that was established earlier statically or via Aries 0160 protocol https://github.com/hyperledger/aries-rfcs/tree/master/features/0160-connection-protocol
         """
         # allocate connection to Agent services
-        agent = self.alloc_agent_connection()
-        await agent.open()
-        try:
+        async with get_connection() as agent:
             # initialize state-machine
             logger = await StreamLogger.create('ledgers')
             state_machine = simple_consensus.state_machines.MicroLedgerSimpleConsensus(
@@ -265,8 +305,6 @@ class Command(BaseCommand):
                 else:
                     explain = ''
                 raise RuntimeError(f'Creation of new ledger was terminated with error: \n"{explain}"')
-        finally:
-            await agent.close()
 
     @sentry_capture_exceptions
     async def accept_transactions(self, propose: simple_consensus.messages.ProposeTransactionsMessage, p2p: Pairwise):
@@ -277,9 +315,7 @@ class Command(BaseCommand):
         :param p2p: pairwise that was established earlier statically or via Aries 0160 protocol https://github.com/hyperledger/aries-rfcs/tree/master/features/0160-connection-protocol
         """
         # allocate connection to Agent services
-        agent = self.alloc_agent_connection()
-        await agent.open()
-        try:
+        async with get_connection() as agent:
             # initialize state-machine
             logger = await StreamLogger.create('transactions')
             state_machine = simple_consensus.state_machines.MicroLedgerSimpleConsensus(
@@ -302,18 +338,12 @@ class Command(BaseCommand):
                     transactions=propose.transactions,
                     their_did=p2p.their.did
                 )
-                try:
-                    cache.delete(settings.INBOX_CACHE_KEY)
-                except:
-                    pass
             else:
                 if state_machine.problem_report:
                     explain = state_machine.problem_report.explain
                 else:
                     explain = ''
                 raise RuntimeError(f'Accepting of new transactions was terminated with error: \n"{explain}"')
-        finally:
-            await agent.close()
 
     @sentry_capture_exceptions
     async def accept_transactions_parallel(self, propose: simple_consensus.messages.ProposeParallelTransactionsMessage, p2p: Pairwise):
@@ -324,9 +354,7 @@ class Command(BaseCommand):
         :param p2p: pairwise that was established earlier statically or via Aries 0160 protocol https://github.com/hyperledger/aries-rfcs/tree/master/features/0160-connection-protocol
         """
         # allocate connection to Agent services
-        agent = self.alloc_agent_connection()
-        await agent.open()
-        try:
+        async with get_connection() as agent:
             # initialize state-machine
             logger = await StreamLogger.create('transactions')
             state_machine = simple_consensus.state_machines.MicroLedgerSimpleConsensus(
@@ -345,21 +373,13 @@ class Command(BaseCommand):
                 propose=propose
             )
             if success:
-                for batch in propose.transactions:
-                    await orm.store_transactions(
-                        ledger=batch.ledger_name,
-                        transactions=batch.transactions,
-                        their_did=p2p.their.did
-                    )
-                try:
-                    cache.delete(settings.INBOX_CACHE_KEY)
-                except:
-                    pass
+                await orm.store_transactions_batch(
+                    batches={batch.ledger_name: batch.transactions for batch in propose.transactions},
+                    their_did=p2p.their.did
+                )
             else:
                 if state_machine.problem_report:
                     explain = state_machine.problem_report.explain
                 else:
                     explain = ''
                 raise RuntimeError(f'Accepting of new transactions was terminated with error: \n"{explain}"')
-        finally:
-            await agent.close()
\ No newline at end of file
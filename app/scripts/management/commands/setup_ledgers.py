@@ -5,7 +5,7 @@ from datetime import datetime, timedelta
 from django.conf import settings
 from django.core.management.base import BaseCommand
 
-from wrapper.models import Ledger, Transaction
+from wrapper.models import Ledger, Transaction, LedgerSummary
 
 
 def get_random_signer():
@@ -91,3 +91,5 @@ class Command(BaseCommand):
                     },
                     metadata={'seqNo': seq_no, 'txnTime': str(stamp)}
                 )
+            # ledgers list is rendered from summaries
+            LedgerSummary.refresh(ledger)
@@ -155,6 +155,14 @@ STATIC_URL = '/static/'
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/content/'
 MEDIA_ROOT = '/tmp'
+CONTENT_CHUNK_SIZE = int(os.getenv('CONTENT_CHUNK_SIZE', 256*1024))
+UPLOAD_SESSIONS_ROOT = os.path.join(MEDIA_ROOT, 'uploads')
+UPLOAD_SESSION_TTL = int(os.getenv('UPLOAD_SESSION_TTL', 24*60*60))
+# Delegate serving of content files to front proxy: 'nginx' (X-Accel-Redirect) or 'apache' (X-Sendfile),
+# files are streamed by application if empty
+CONTENT_OFFLOAD = os.getenv('CONTENT_OFFLOAD', '').lower()
+# nginx internal location that is alias of MEDIA_ROOT
+CONTENT_OFFLOAD_URL = os.getenv('CONTENT_OFFLOAD_URL', '/protected-content/')
 
 SENTRY_DSN = os.getenv('SENTRY_DSN')
 
@@ -168,6 +176,15 @@ AGENT = {
     'is_sea': os.getenv('AGENT_IS_SEA', False) in ['1', 'on', 'yes'],
     'ledger': 'staging'
 }
+AGENT_POOL_SIZE = int(os.getenv('AGENT_POOL_SIZE', 10))
+AGENT_POOL_IDLE_TIMEOUT = int(os.getenv('AGENT_POOL_IDLE_TIMEOUT', 60))
+AGENT_POOL_HEALTH_CHECK_INTERVAL = int(os.getenv('AGENT_POOL_HEALTH_CHECK_INTERVAL', 15))
+SCHEDULER_LOOPS = int(os.getenv('SCHEDULER_LOOPS', 4))
+AGENT_HEALTH_CHECK_INTERVAL = int(os.getenv('AGENT_HEALTH_CHECK_INTERVAL', 30))
+AGENT_HEALTH_TIMEOUT = int(os.getenv('AGENT_HEALTH_TIMEOUT', 5))
+AGENT_HEALTH_CACHE_KEY = 'health:agent'
+PARTICIPANTS_HEALTH_CACHE_KEY = 'health:participants'
+CONN_REQUESTS_RECONNECT_INTERVAL = int(os.getenv('CONN_REQUESTS_RECONNECT_INTERVAL', 5))
 if AGENT['credentials'] and AGENT['server_address']:
     sirius_sdk.init(
         server_uri=AGENT['server_address'],
@@ -238,6 +255,16 @@ PARTICIPANTS = [
 ]
 
 
+PAIRWISE_CACHE_TTL = int(os.getenv('PAIRWISE_CACHE_TTL', 300))
+BROADCAST_TIMEOUT = int(os.getenv('BROADCAST_TIMEOUT', 15))
+NOTIFICATIONS_COALESCE_WINDOW = int(os.getenv('NOTIFICATIONS_COALESCE_WINDOW', 5))
+NOTIFICATIONS_CONCURRENCY = int(os.getenv('NOTIFICATIONS_CONCURRENCY', 10))
+SMART_CONTRACTS_CONCURRENCY = int(os.getenv('SMART_CONTRACTS_CONCURRENCY', 10))
+SMART_CONTRACTS_QUEUE_SIZE = int(os.getenv('SMART_CONTRACTS_QUEUE_SIZE', 100))
+SMART_CONTRACTS_METRICS_INTERVAL = int(os.getenv('SMART_CONTRACTS_METRICS_INTERVAL', 10))
+SMART_CONTRACTS_METRICS_CACHE_KEY = 'smart_contracts:metrics'
+
+
 ADMIN_USERNAME = os.getenv('ADMIN_USERNAME', None)
 ADMIN_PASSWORD = os.getenv('ADMIN_PASSWORD', None)
 REDIS = os.getenv('REDIS', None)
@@ -253,8 +280,18 @@ CACHES = {
         "KEY_PREFIX": os.getenv('AGENT_ENTITY', 'default')
     }
 }
-INBOX_CACHE_KEY = 'inbox'
 LEDGERS_CACHE_KEY = 'ledgers'
+LEDGERS_CACHE_TIMEOUT = 60*60
+BASIC_AUTH_CACHE_TTL = int(os.getenv('BASIC_AUTH_CACHE_TTL', 300))
+TOKEN_TTL = int(os.getenv('TOKEN_TTL', 12*60*60))
+TOKEN_LRU_SIZE = int(os.getenv('TOKEN_LRU_SIZE', 1024))
+TOKEN_PURGE_INTERVAL = int(os.getenv('TOKEN_PURGE_INTERVAL', 60*60))
+QR_POOL_SIZE = int(os.getenv('QR_POOL_SIZE', 20))
+QR_POOL_REFILL_INTERVAL = int(os.getenv('QR_POOL_REFILL_INTERVAL', 5))
+QR_POOL_TTL = int(os.getenv('QR_POOL_TTL', 24*60*60))
+QR_VALIDATION_CACHE_TTL = int(os.getenv('QR_VALIDATION_CACHE_TTL', 10*60))
+USER_IMPORT_CONCURRENCY = int(os.getenv('USER_IMPORT_CONCURRENCY', 10))
+USER_IMPORT_TIMEOUT = int(os.getenv('USER_IMPORT_TIMEOUT', 10*60))
 PATH_INDEX = os.getenv('PATH_INDEX', '')
 if PATH_INDEX.isdigit():
     PATH_INDEX = int(PATH_INDEX)
@@ -271,6 +308,13 @@ TMTM_PATH = [
     '6jzbnVE5S6j15afcpC9yhF',  # GR Logistics
 ]
 
+# Previous entities on route for tab "Приближаются", previous entity of TMTM_PATH if not set.
+# Run build_ledger_summaries after changes
+TMTM_PREV_ENTITIES = {
+    # Для Порт Баку во вкладке "Приближаются" необходимо отображать не только контейнеры которые вышли с
+    # Порта Актау, но и те которые только вышли с КТЖ Экспресс.
+    'Ch4eVSWf7KXRubk5to6WFC': ['VU7c9jvBqLee9NkChXU1Kn', 'U9A6U7LZQe4dCh84t3fpTK'],
+}
 TMTM_PATH_TIME = {
     'U9A6U7LZQe4dCh84t3fpTK': None,  #
     'VU7c9jvBqLee9NkChXU1Kn': 5,  # DKR => Port Aktau FOR 5 days
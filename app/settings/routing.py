@@ -1,11 +1,27 @@
+from channels.http import AsgiHandler
 from channels.routing import ProtocolTypeRouter, URLRouter
 from django.conf.urls import url
 
 from wrapper.websockets import WsTransactions, WsQRCodeAuth, WsQRCredentialsAuth
+from ui.views import TransactionsView, AuthView, UserCreationView, CredentialsView, CreateGU11View, CreateGU12View, \
+    UserImportView
+from ui.consumers import AsyncViewRouter
 
 
 application = ProtocolTypeRouter(
     {
+        "http":
+            URLRouter([
+                # views with agent interactions are served on event loop
+                url("^auth/$", AsyncViewRouter(AuthView)),
+                url("^transactions/$", AsyncViewRouter(TransactionsView)),
+                url("^user-create/$", AsyncViewRouter(UserCreationView)),
+                url("^user-import/$", AsyncViewRouter(UserImportView)),
+                url("^credentials/$", AsyncViewRouter(CredentialsView)),
+                url("^create-gu11/$", AsyncViewRouter(CreateGU11View)),
+                url("^create-gu12/$", AsyncViewRouter(CreateGU12View)),
+                url("", AsgiHandler),
+            ]),
         "websocket":
             URLRouter([
                 # url("^events/(?P<stream_id>.*)$", WsTransactions),
@@ -18,8 +18,9 @@ from django.conf.urls import url, include
 from django.conf import settings
 from ui.views import TransactionsView, IndexView, SmartContractInitLedgerView, SmartContractCommitView, \
     AuthView, LogoutView, AdminView, GU11View, GU12View, UserCreationView, CredentialsView, AuthByRefView, \
-    CreateGU11View, CreateGU12View, InboxView
-from wrapper.views import MaintenanceRouter, LedgersRouter, UploadView, ContentView, GU11Router, GU12Router
+    CreateGU11View, CreateGU12View, InboxView, UserImportView
+from wrapper.views import MaintenanceRouter, LedgersRouter, UploadView, ContentView, GU11Router, GU12Router, \
+    UploadsRouter
 
 
 CONTENT_URL = settings.MEDIA_URL
@@ -35,6 +36,7 @@ urlpatterns = [
     path('inbox/', InboxView.as_view(), name='inbox'),
     path('admin/', AdminView.as_view(), name='admin'),
     path('user-create/', UserCreationView.as_view(), name='user-create'),
+    path('user-import/', UserImportView.as_view(), name='user-import'),
     path('gu11/', GU11View.as_view(), name='gu11'),
     path('gu12/', GU12View.as_view(), name='gu12'),
     path('create-gu11/', CreateGU11View.as_view(), name='create-gu11'),
@@ -45,6 +47,7 @@ urlpatterns = [
     path('smart_contract_commit_txns/', SmartContractCommitView.as_view(), name='smart-contract-commit-txns'),
     path('', IndexView.as_view(), name='index'),
     # Uploads
+    url(r'^', include(UploadsRouter.urls)),
     url(r'^upload', UploadView.as_view(), name='upload'),
     path(CONTENT_URL + '<uid>', ContentView.as_view(), name='content'),
     # Maintenance
@@ -0,0 +1,56 @@
+import os
+
+import pytest
+from django.db import transaction
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from wrapper.models import Content
+
+
+@pytest.fixture
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.UPLOAD_SESSIONS_ROOT = str(tmp_path / 'uploads')
+    return tmp_path
+
+
+def store(name: str, data: bytes) -> Content:
+    with transaction.atomic():
+        return Content.store(SimpleUploadedFile(name, data, content_type='text/plain'))
+
+
+def stored_files(media_root) -> list:
+    return sorted(path for path in os.listdir(str(media_root)) if path != 'uploads')
+
+
+@pytest.mark.django_db
+def test_duplicate_is_referenced(media_root):
+    first = store('a.txt', b'hello')
+    second = store('b.txt', b'hello')
+    assert second.uid == first.uid
+    assert second.ref_count == 2
+    assert Content.objects.count() == 1
+    assert stored_files(media_root) == [first.uid]
+    # received file of duplicate is not left behind
+    assert os.listdir(str(media_root / 'uploads')) == []
+
+
+@pytest.mark.django_db
+def test_different_content_is_stored_separately(media_root):
+    first = store('a.txt', b'hello')
+    second = store('b.txt', b'world')
+    assert first.uid != second.uid
+    assert first.ref_count == second.ref_count == 1
+    assert stored_files(media_root) == sorted([first.uid, second.uid])
+
+
+@pytest.mark.django_db
+def test_blob_is_deleted_with_last_reference(media_root):
+    first = store('a.txt', b'hello')
+    second = store('b.txt', b'hello')
+    first.delete()
+    assert Content.objects.get(uid=second.uid).ref_count == 1
+    assert stored_files(media_root) == [second.uid]
+    second.delete()
+    assert not Content.objects.filter(uid=second.uid).exists()
+    assert stored_files(media_root) == []
@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from scripts.management.commands.dispatcher import Dispatcher
+
+
+def make_job(log: list, name: str, delay: float = 0):
+    async def job():
+        log.append(('start', name))
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            log.append(('end', name))
+    return job
+
+
+@pytest.mark.asyncio
+async def test_stop_drains_submitted_jobs():
+    log = []
+    dispatcher = Dispatcher(concurrency=2, queue_size=10)
+    dispatcher.start()
+    for n in range(5):
+        await dispatcher.submit(make_job(log, str(n), 0.01), keys=['ledger-%d' % (n % 2)])
+    await dispatcher.stop()
+    assert sorted(name for event, name in log if event == 'end') == ['0', '1', '2', '3', '4']
+    metrics = dispatcher.metrics()
+    assert metrics['processed'] == 5
+    assert metrics['queue_depth'] == 0 and metrics['running'] == 0
+
+
+@pytest.mark.asyncio
+async def test_stopped_dispatcher_rejects_jobs():
+    dispatcher = Dispatcher(concurrency=1, queue_size=1)
+    dispatcher.start()
+    await dispatcher.stop()
+    with pytest.raises(RuntimeError):
+        await dispatcher.submit(make_job([], 'late'))
+
+
+@pytest.mark.asyncio
+async def test_stop_cancels_jobs_not_drained_in_time():
+    log = []
+    dispatcher = Dispatcher(concurrency=1, queue_size=1)
+    dispatcher.start()
+    await dispatcher.submit(make_job(log, 'slow', 10))
+    await asyncio.sleep(0)
+    await asyncio.wait_for(dispatcher.stop(timeout=0.05), 1)
+    assert log == [('start', 'slow'), ('end', 'slow')]
+    assert dispatcher.metrics()['processed'] == 0
+
+
+@pytest.mark.asyncio
+async def test_burst_for_one_key_doesnt_hold_workers():
+    log = []
+    dispatcher = Dispatcher(concurrency=2, queue_size=10)
+    dispatcher.start()
+    for n in range(3):
+        await dispatcher.submit(make_job(log, 'a%d' % n, 0.05), keys=['ledger-a'])
+    await dispatcher.submit(make_job(log, 'b', 0), keys=['ledger-b'])
+    await dispatcher.stop()
+    # jobs of same key run one by one, other key doesn't wait for them
+    assert log.index(('end', 'b')) < log.index(('start', 'a1'))
+    a_events = [item for item in log if item[1].startswith('a')]
+    assert a_events == [(event, 'a%d' % n) for n in range(3) for event in ['start', 'end']]
+
+
+@pytest.mark.asyncio
+async def test_failed_job_is_counted():
+    async def failed():
+        raise RuntimeError('boom')
+
+    dispatcher = Dispatcher(concurrency=1, queue_size=1)
+    dispatcher.start()
+    await dispatcher.submit(failed)
+    await dispatcher.stop()
+    assert dispatcher.metrics()['errors'] == 1
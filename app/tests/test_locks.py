@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from scripts.management.commands.locks import KeyedLock
+
+
+async def enter(guard):
+    await guard.__aenter__()
+
+
+async def leave(guard):
+    await guard.__aexit__(None, None, None)
+
+
+@pytest.mark.asyncio
+async def test_same_key_is_acquired_in_reservation_order():
+    locks = KeyedLock()
+    entered = []
+
+    async def job(name, guard):
+        async with guard:
+            entered.append(name)
+            await asyncio.sleep(0)
+
+    guards = [(name, locks.reserve(['ledger-1'])) for name in ['a', 'b', 'c']]
+    # started in reverse order, order of reservations wins
+    await asyncio.gather(*[job(name, guard) for name, guard in reversed(guards)])
+    assert entered == ['a', 'b', 'c']
+    assert locks.metrics()['locked_keys'] == 0
+    assert locks.metrics()['contended'] == 2
+
+
+@pytest.mark.asyncio
+async def test_different_keys_dont_block_each_other():
+    locks = KeyedLock()
+    first = locks.reserve(['ledger-1'])
+    second = locks.reserve(['ledger-2'])
+    await enter(first)
+    await asyncio.wait_for(enter(second), 1)
+    await leave(second)
+    await leave(first)
+
+
+@pytest.mark.asyncio
+async def test_several_keys_wait_for_all_predecessors():
+    locks = KeyedLock()
+    first = locks.reserve(['ledger-1'])
+    second = locks.reserve(['ledger-2'])
+    both = locks.reserve(['ledger-1', 'ledger-2'])
+    await enter(first)
+    await enter(second)
+    ready = both.ready()
+    await leave(first)
+    await asyncio.sleep(0)
+    assert not ready.done()
+    await leave(second)
+    await asyncio.wait_for(ready, 1)
+
+
+@pytest.mark.asyncio
+async def test_released_reservation_keeps_order_of_successors():
+    locks = KeyedLock()
+    first = locks.reserve(['ledger-1'])
+    skipped = locks.reserve(['ledger-1'])
+    last = locks.reserve(['ledger-1'])
+    await enter(first)
+    # guard that is never entered gives up its turn, but successor still waits for first one
+    skipped.release()
+    ready = last.ready()
+    await asyncio.sleep(0)
+    assert not ready.done()
+    await leave(first)
+    await asyncio.wait_for(ready, 1)
@@ -0,0 +1,40 @@
+import pytest
+
+from wrapper.utils import parse_range_header
+
+
+@pytest.mark.parametrize('header, size, expected', [
+    (None, 100, None),
+    ('', 100, None),
+    ('items=0-9', 100, None),
+    ('bytes=0-9', 100, (0, 9)),
+    ('bytes=90-', 100, (90, 99)),
+    ('bytes=90-1000', 100, (90, 99)),
+    ('bytes=-10', 100, (90, 99)),
+    ('bytes=-1000', 100, (0, 99)),
+    ('bytes=0-0', 1, (0, 0)),
+])
+def test_single_range(header, size, expected):
+    assert parse_range_header(header, size) == expected
+
+
+@pytest.mark.parametrize('header', ['bytes=0-1,5-6', 'bytes=-1, 0-'])
+def test_multiple_ranges_are_not_served(header):
+    assert parse_range_header(header, 100) is None
+
+
+@pytest.mark.parametrize('header', ['bytes=-', 'bytes=a-b', 'bytes=1', 'bytes=-x'])
+def test_malformed_range_is_ignored(header):
+    assert parse_range_header(header, 100) is None
+
+
+@pytest.mark.parametrize('header, size', [
+    ('bytes=-0', 100),
+    ('bytes=0-', 0),
+    ('bytes=-5', 0),
+    ('bytes=100-', 100),
+    ('bytes=5-3', 100),
+])
+def test_unsatisfiable_range(header, size):
+    with pytest.raises(ValueError):
+        parse_range_header(header, size)
@@ -0,0 +1,114 @@
+import sys
+import logging
+from io import BytesIO
+from typing import Type, Optional, List
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseServerError
+from django.utils.module_loading import import_string
+from channels.db import database_sync_to_async
+from channels.http import AsgiRequest, AsgiHandler
+from channels.generic.http import AsyncHttpConsumer
+from rest_framework.views import APIView
+from rest_framework.request import Request
+
+
+_middleware: Optional[List] = None
+
+
+def load_middleware() -> list:
+    """Instances of settings.MIDDLEWARE that have process_request/process_view/process_response hooks"""
+    global _middleware
+    if _middleware is None:
+        classes = [import_string(path) for path in settings.MIDDLEWARE]
+        _middleware = [
+            cls() for cls in classes
+            if any(hasattr(cls, hook) for hook in ['process_request', 'process_view', 'process_response'])
+        ]
+    return _middleware
+
+
+class AsyncViewConsumer(AsyncHttpConsumer):
+    """Serves APIView with async handlers (aget, apost, ...) on event loop of ASGI server.
+
+    Middleware hooks, authentication, permissions, parsing and rendering run in threads
+    of database_sync_to_async, handler itself awaits agent calls directly, so request
+    doesn't hold a thread while waiting for agent.
+    """
+
+    def __init__(self, scope, view_class: Type[APIView]):
+        super().__init__(scope)
+        self.view_class = view_class
+
+    async def handle(self, body):
+        try:
+            view = self.view_class()
+            request, response = await database_sync_to_async(self.prepare)(view, body)
+            if response is None:
+                handler = getattr(view, 'a' + request.method.lower())
+                try:
+                    response = await handler(request, **view.kwargs)
+                except Exception as exc:
+                    response = await database_sync_to_async(view.handle_exception)(exc)
+            response = await database_sync_to_async(self.finalize)(view, request, response)
+        except Exception as e:
+            logging.error('Async view %s terminated with exception' % self.view_class.__name__, exc_info=sys.exc_info())
+            response = HttpResponseServerError(repr(e) if settings.DEBUG else 'Internal Server Error')
+        for message in AsgiHandler.encode_response(response):
+            await self.send(message)
+        response.close()
+
+    def prepare(self, view: APIView, body: bytes) -> (Request, Optional[HttpResponse]):
+        """Same steps as middleware chain and APIView.dispatch do before handler call"""
+        http_request = AsgiRequest(self.scope, BytesIO(body))
+        kwargs = self.scope.get('url_route', {}).get('kwargs', {})
+        for middleware in load_middleware():
+            if hasattr(middleware, 'process_request'):
+                response = middleware.process_request(http_request)
+                if response is not None:
+                    return http_request, response
+        callback = self.view_class.as_view()
+        for middleware in load_middleware():
+            if hasattr(middleware, 'process_view'):
+                response = middleware.process_view(http_request, callback, (), kwargs)
+                if response is not None:
+                    return http_request, response
+        view.args, view.kwargs = (), kwargs
+        request = view.initialize_request(http_request)
+        view.request = request
+        view.headers = view.default_response_headers
+        try:
+            view.initial(request)
+            # parse body here, parsers may touch disk
+            _ = request.data
+        except Exception as exc:
+            return request, view.handle_exception(exc)
+        return request, None
+
+    def finalize(self, view: APIView, request, response: HttpResponse) -> HttpResponse:
+        http_request = request
+        if isinstance(request, Request):
+            response = view.finalize_response(request, response)
+            http_request = request._request
+        if callable(getattr(response, 'render', None)):
+            response = response.render()
+        for middleware in reversed(load_middleware()):
+            if hasattr(middleware, 'process_response'):
+                response = middleware.process_response(http_request, response)
+        return response
+
+
+class AsyncViewRouter:
+    """Routes requests to AsyncViewConsumer if view has async handler for method, to AsgiHandler otherwise
+
+        url(r'^auth/$', AsyncViewRouter(AuthView))
+    """
+
+    def __init__(self, view_class: Type[APIView]):
+        self.view_class = view_class
+
+    def __call__(self, scope):
+        if hasattr(self.view_class, 'a' + scope['method'].lower()):
+            return AsyncViewConsumer(scope, self.view_class)
+        else:
+            return AsgiHandler(scope)
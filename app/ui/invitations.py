@@ -0,0 +1,59 @@
+import asyncio
+import logging
+
+from django.conf import settings
+from channels.db import database_sync_to_async
+from sirius_sdk import Agent
+from sirius_sdk.agent.aries_rfc.feature_0160_connection_protocol import Invitation
+
+from wrapper.pool import get_connection
+from .models import QRCode
+
+
+async def create_invitation_qr(agent: Agent, claimed: bool = True) -> QRCode:
+    """Create connection key, invitation and QR code of invitation url"""
+    entity = settings.AGENT['entity']
+    endpoint_address = [e for e in agent.endpoints if e.routing_keys == []][0].address
+    connection_key = await agent.wallet.crypto.create_key()
+    invitation = Invitation(
+        label=settings.PARTICIPANTS_META[entity]['label'],
+        endpoint=endpoint_address,
+        recipient_keys=[connection_key]
+    )
+    invitation['did'] = entity
+    url = await agent.generate_qr_code(invitation.invitation_url)
+    my_endpoint = {
+        'address': endpoint_address,
+        'routing_keys': []
+    }
+    qr, _ = await database_sync_to_async(QRCode.objects.get_or_create)(
+        connection_key=connection_key, url=url, my_endpoint=my_endpoint, defaults={'claimed': claimed}
+    )
+    return qr
+
+
+async def refill_qr_pool() -> int:
+    """Generate invitations until pool has QR_POOL_SIZE unclaimed records
+
+    :return: count of generated invitations
+    """
+    await database_sync_to_async(QRCode.purge_expired_pool)()
+    missing = settings.QR_POOL_SIZE - await database_sync_to_async(QRCode.pool_size)()
+    if missing <= 0:
+        return 0
+    async with get_connection() as agent:
+        for _ in range(missing):
+            await create_invitation_qr(agent, claimed=False)
+    return missing
+
+
+async def run_qr_pool_refiller():
+    while True:
+        if settings.AGENT['entity']:
+            try:
+                generated = await refill_qr_pool()
+                if generated:
+                    logging.error('* invitations QR pool refilled: %d' % generated)
+            except Exception as e:
+                logging.error('Exception while refill invitations QR pool: ' + repr(e))
+        await asyncio.sleep(settings.QR_POOL_REFILL_INTERVAL)
@@ -0,0 +1,23 @@
+# Generated by Django 2.2 on 2026-10-18 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ui', '0010_auto_20201015_0016'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='qrcode',
+            name='claimed',
+            field=models.BooleanField(db_index=True, default=True),
+        ),
+        migrations.AddField(
+            model_name='qrcode',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, null=True),
+        ),
+    ]
@@ -1,4 +1,11 @@
+import hashlib
+from datetime import timedelta
+from typing import Optional
+
 from django.db import models
+from django.utils import timezone
+from django.db.transaction import atomic
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.postgres.fields import JSONField
 
@@ -7,6 +14,40 @@ class QRCode(models.Model):
     connection_key = models.CharField(max_length=64, db_index=True)
     my_endpoint = JSONField(null=True)
     url = models.CharField(max_length=2048, db_index=True)
+    # pre-generated invitations wait in pool unclaimed, see claim()
+    claimed = models.BooleanField(default=True, db_index=True)
+    created = models.DateTimeField(auto_now_add=True, null=True)
+
+    @staticmethod
+    def claim() -> Optional['QRCode']:
+        """Take ready invitation from pool, concurrent requests never get same record"""
+        with atomic():
+            qr = QRCode.__pool().select_for_update(skip_locked=True).order_by('id').first()
+            if qr is not None:
+                qr.claimed = True
+                qr.save(update_fields=['claimed'])
+        return qr
+
+    @staticmethod
+    def pool_size() -> int:
+        return QRCode.__pool().count()
+
+    @staticmethod
+    def purge_expired_pool() -> int:
+        deleted, _ = QRCode.objects.filter(
+            claimed=False, created__lt=timezone.now() - timedelta(seconds=settings.QR_POOL_TTL)
+        ).delete()
+        return deleted
+
+    @staticmethod
+    def __pool():
+        return QRCode.objects.filter(
+            claimed=False, created__gte=timezone.now() - timedelta(seconds=settings.QR_POOL_TTL)
+        )
+
+
+def get_qr_cache_key(url: str) -> str:
+    return 'qr:valid:' + hashlib.md5(url.encode()).hexdigest()
 
 
 class PairwiseRecord(models.Model):
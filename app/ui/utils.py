@@ -1,11 +1,19 @@
+import time
 import asyncio
 import threading
+import concurrent.futures
+
+from django.conf import settings
 
 
 def run_async(coro, timeout=15):
     return Scheduler.run_async(coro, timeout)
 
 
+def get_scheduler_metrics() -> dict:
+    return Scheduler.metrics()
+
+
 async def run_coroutines(*args, timeout: int = 15):
     results = []
     items = [i for i in args]
@@ -20,41 +28,94 @@ async def run_coroutines(*args, timeout: int = 15):
 
 
 class Scheduler:
+    """Pool of event loops running in daemon threads.
+
+    Coroutine is scheduled to least loaded loop, so slow call doesn't delay others.
+    Coroutine is cancelled if caller stops waiting for it by timeout.
+    """
 
     __instance = None
+    __instance_lock = threading.Lock()
 
-    def __init__(self):
+    def __init__(self, size: int):
         if self.__instance is not None:
             raise RuntimeError()
         else:
-            self.__loop = asyncio.new_event_loop()
-            self.__thread = threading.Thread(target=self.__run_event_loop_in_thread, args=(self.__loop,))
-            self.__thread.daemon = True
-            self.__thread.start()
+            self.__workers = []
+            for n in range(size):
+                worker = ThreadScheduler()
+                worker.start()
+                self.__workers.append(worker)
+            self.__in_flight = [0] * size
+            self.__lock = threading.Lock()
+            self.__counters = dict(submitted=0, started=0, completed=0, timeouts=0, errors=0)
+            self.__queue_time = 0.0
+            self.__max_queue_time = 0.0
 
     @classmethod
     def run_async(cls, coro, timeout=5):
         assert asyncio.coroutines.iscoroutine(coro)
-        fut = asyncio.run_coroutine_threadsafe(coro, loop=cls.__get_instance().__loop)
-        try:
-            return fut.result(timeout)
-        except asyncio.TimeoutError:
-            raise TimeoutError()
-
-    @staticmethod
-    def __run_event_loop_in_thread(loop):
-        asyncio.set_event_loop(loop)
-        loop.run_forever()
+        return cls.__get_instance().__submit(coro, timeout)
 
     @classmethod
-    def __get_loop(cls):
-        return cls.__get_instance().__loop
+    def metrics(cls) -> dict:
+        """Empty if scheduler was not used by process yet, metrics don't start loops"""
+        self = cls.__instance
+        if self is None:
+            return {}
+        with self.__lock:
+            started = self.__counters['started']
+            return dict(
+                loops=len(self.__workers),
+                in_flight=list(self.__in_flight),
+                avg_queue_ms=round(1000 * self.__queue_time / started, 2) if started else 0,
+                max_queue_ms=round(1000 * self.__max_queue_time, 2),
+                **self.__counters
+            )
+
+    def __submit(self, coro, timeout):
+        with self.__lock:
+            index = min(range(len(self.__workers)), key=self.__in_flight.__getitem__)
+            self.__in_flight[index] += 1
+            self.__counters['submitted'] += 1
+        fut = asyncio.run_coroutine_threadsafe(
+            self.__measured(coro, time.monotonic()), loop=self.__workers[index].loop
+        )
+        try:
+            result = fut.result(timeout)
+        except concurrent.futures.TimeoutError:
+            # don't leave coroutine running when nobody waits for result
+            fut.cancel()
+            self.__count('timeouts')
+            raise TimeoutError()
+        except Exception:
+            self.__count('errors')
+            raise
+        else:
+            self.__count('completed')
+            return result
+        finally:
+            with self.__lock:
+                self.__in_flight[index] -= 1
+
+    async def __measured(self, coro, stamp: float):
+        wait_time = time.monotonic() - stamp
+        with self.__lock:
+            self.__counters['started'] += 1
+            self.__queue_time += wait_time
+            self.__max_queue_time = max(self.__max_queue_time, wait_time)
+        return await coro
+
+    def __count(self, counter: str):
+        with self.__lock:
+            self.__counters[counter] += 1
 
     @classmethod
     def __get_instance(cls):
-        if not cls.__instance:
-            cls.__instance = Scheduler()
-        return cls.__instance
+        with cls.__instance_lock:
+            if not cls.__instance:
+                cls.__instance = Scheduler(settings.SCHEDULER_LOOPS)
+            return cls.__instance
 
 
 class ThreadScheduler:
@@ -1,9 +1,10 @@
 import json
 import uuid
+import asyncio
 import copy
 import logging
 import datetime
-from typing import List, Dict
+from typing import List, Dict, Optional, Callable
 from urllib.parse import urlsplit
 
 from requests import get as request_get
@@ -12,7 +13,7 @@ from rest_framework.response import Response
 from rest_framework.authentication import SessionAuthentication
 from rest_framework.renderers import TemplateHTMLRenderer, JSONRenderer
 from rest_framework.permissions import BasePermission
-from rest_framework import serializers
+from rest_framework import serializers, exceptions
 from django.utils import timezone
 from django.conf import settings
 from django.core.cache import cache
@@ -20,14 +21,17 @@ from django.urls import reverse, reverse_lazy
 from django.contrib.auth.models import User
 from django.contrib.auth import login, logout
 from django.http.response import HttpResponseRedirect
+from channels.db import database_sync_to_async
 from sirius_sdk import Agent, P2PConnection
-from sirius_sdk.messaging import Message
-from sirius_sdk.agent.aries_rfc.feature_0160_connection_protocol import Invitation
 
-from wrapper.models import Ledger, Token, UserEntityBind, GURecord
+from wrapper.models import LedgerSummary, Token, UserEntityBind, GURecord, \
+    get_ledgers_index_key, get_ledger_cache_keys
 from wrapper.views import LedgerSerializer, TransactionSerializer
-from wrapper.websockets import get_connection
-from ui.models import QRCode, CredentialQR, AuthRef
+from wrapper.pool import get_connection
+from wrapper.broadcast import broadcast
+from wrapper.health import get_agent_health, check_agent_health
+from ui.models import QRCode, CredentialQR, AuthRef, get_qr_cache_key
+from .invitations import create_invitation_qr
 from .utils import run_async
 
 
@@ -43,94 +47,93 @@ MENU = [
 ]
 
 
+def build_ledger_record(summary: LedgerSummary) -> dict:
+    return {
+        'id': summary.ledger.id,
+        'name': summary.ledger.name,
+        'ledger': LedgerSerializer(summary.ledger).data,
+        'last_txn': TransactionSerializer(summary.last_txn).data,
+        'first_txn': TransactionSerializer(summary.first_txn).data,
+        'signer_did': summary.signer_did,
+        'approaching': summary.approaching,
+        'stamp': summary.last_txn.created
+    }
+
+
+def load_ledger_ids() -> List[int]:
+    """Ids of ledgers of entity, index is cached until set of ledgers changes"""
+    index_key = get_ledgers_index_key()
+    ledger_ids = cache.get(index_key)
+    if ledger_ids is None:
+        ledger_ids = list(
+            LedgerSummary.objects.filter(
+                entity=settings.AGENT['entity'], last_txn__isnull=False
+            ).order_by('ledger_id').values_list('ledger_id', flat=True)
+        )
+        cache.set(index_key, ledger_ids, settings.LEDGERS_CACHE_TIMEOUT)
+    return ledger_ids
+
+
+def load_ledger_records(ledger_ids: List[int]) -> List[dict]:
+    """Load ledgers records from cache, only records invalidated by recent commits are rebuilt from database"""
+    keys = get_ledger_cache_keys(ledger_ids)
+    records = cache.get_many(list(keys.values()))
+    missing = [ledger_id for ledger_id, key in keys.items() if key not in records]
+    if missing:
+        fresh = {}
+        queryset = LedgerSummary.objects.filter(
+            ledger_id__in=missing, last_txn__isnull=False
+        ).select_related('ledger', 'first_txn', 'last_txn').all()
+        for summary in queryset:
+            fresh[keys[summary.ledger_id]] = build_ledger_record(summary)
+        cache.set_many(fresh, settings.LEDGERS_CACHE_TIMEOUT)
+        records.update(fresh)
+    return [records[keys[ledger_id]] for ledger_id in ledger_ids if keys[ledger_id] in records]
+
+
 def build_all_ledgers(limit: int = 200, offset: int = 0) -> list:
-    cached = cache.get(settings.LEDGERS_CACHE_KEY)
-    if cached:
-        return cached
-    my_entity = settings.AGENT['entity']
-    try:
-        my_index = settings.TMTM_PATH.index(my_entity)
-        if settings.PATH_INDEX is not None:
-            my_index = settings.PATH_INDEX
-    except ValueError:
-        my_index = -1
-    queryset = Ledger.objects.filter(entity=settings.AGENT['entity']).all()
     collection = []
     seq_id = 1
-    for ledger in queryset[offset:limit]:
-        last_txn = ledger.transaction_set.last()
-        first_txn = ledger.transaction_set.first()
-        if last_txn:
-            obj = {
-                'seq_id': seq_id,
-                'id': ledger.id,
-                'name': ledger.name,
-                'last_txn': TransactionSerializer(last_txn).data,
-                'first_txn': TransactionSerializer(first_txn).data
-            }
-            if my_index > 0:
-                prev_entity = settings.TMTM_PATH[my_index - 1]
-                prev_entities = [prev_entity]
-                # Для Порт Баку во вкладке "Приближаются" необходимо отображать не только контейнеры которые вышли с
-                # Порта Актау, но и те которые только вышли с КТЖ Экспресс.
-                if my_index == 2:
-                    prev_entities.append(settings.TMTM_PATH[0])
-                signer_verkey = last_txn.txn.get('msg~sig', {}).get('signer', None)
-                signer_did = [did for did, meta in settings.PARTICIPANTS_META.items() if meta['verkey'] == signer_verkey]
-                signer_did = signer_did[0] if signer_did else None
-                approaching = signer_did in prev_entities
-            else:
-                approaching = False
-            obj['approaching'] = approaching
-            collection.append(obj)
-            seq_id += 1
-    cache.set(settings.LEDGERS_CACHE_KEY, collection, 60)
+    for record in load_ledger_records(load_ledger_ids()[offset:limit]):
+        obj = {
+            'seq_id': seq_id,
+            'id': record['id'],
+            'name': record['name'],
+            'last_txn': record['last_txn'],
+            'first_txn': record['first_txn'],
+            'approaching': record['approaching']
+        }
+        collection.append(obj)
+        seq_id += 1
     return collection
 
 
+def get_approaching_summaries():
+    """Summaries of ledgers approaching to us, see LedgerSummary.approaching"""
+    return LedgerSummary.objects.filter(
+        entity=settings.AGENT['entity'], approaching=True, last_txn__isnull=False
+    )
+
+
 def build_inbox_ledgers() -> list:
     if settings.AGENT['entity']:
-        my_entity = settings.AGENT['entity']
-        try:
-            my_index = settings.TMTM_PATH.index(my_entity)
-            if settings.PATH_INDEX is not None:
-                my_index = settings.PATH_INDEX
-        except ValueError:
-            my_index = -1
-        if my_index > 0:
-            cached = cache.get(settings.INBOX_CACHE_KEY)
-            if cached:
-                return cached
-            collection = []
-            prev_entity = settings.TMTM_PATH[my_index-1]
-            for ledger in Ledger.objects.filter(entity=my_entity).all():
-                txn_last = ledger.transaction_set.last()
-                if txn_last:
-                    signer_verkey = txn_last.txn.get('msg~sig', {}).get('signer', None)
-                    signer_did = [did for did, meta in settings.PARTICIPANTS_META.items() if meta['verkey'] == signer_verkey]
-                    signer_did = signer_did[0] if signer_did else None
-                    if signer_did == prev_entity:
-                        collection.append(
-                            {
-                                'ledger': LedgerSerializer(ledger).data,
-                                'txn': TransactionSerializer(txn_last).data,
-                                'stamp': txn_last.created
-                            }
-                        )
-            collection = sorted(collection, key=lambda x: x['stamp'])
-            collection = [{'ledger': x['ledger'], 'txn': x['txn']} for x in collection]
-            cache.set(settings.INBOX_CACHE_KEY, collection, 60)
-            return collection
-        else:
-            return []
+        ledger_ids = list(get_approaching_summaries().values_list('ledger_id', flat=True))
+        collection = sorted(load_ledger_records(ledger_ids), key=lambda x: x['stamp'])
+        return [{'ledger': x['ledger'], 'txn': x['last_txn']} for x in collection]
     else:
         return []
 
 
+def count_inbox_ledgers() -> int:
+    if settings.AGENT['entity']:
+        return get_approaching_summaries().count()
+    else:
+        return 0
+
+
 def calc_menu(request=None):
     menu = copy.deepcopy(MENU)
-    inbox = build_inbox_ledgers()
-    menu[1]['caption'] = menu[1]['caption'] + ' [%d]' % len(inbox)
+    menu[1]['caption'] = menu[1]['caption'] + ' [%d]' % count_inbox_ledgers()
     menu[-1]['enabled'] = request.user.is_superuser
     return menu
 
@@ -162,6 +165,47 @@ class TransactionsView(APIView):
     def get(self, request, *args, **kwargs):
         if not (request.user and request.user.is_authenticated):
             return HttpResponseRedirect(redirect_to=reverse('auth'))
+        try:
+            credentials, monitored = self.load_credentials(request)
+            try:
+                if monitored:
+                    health = get_agent_health() or run_async(check_agent_health())
+                    assert health['alive'] is True
+                else:
+                    run_async(self.check_agent_credentials(credentials))
+            except Exception as e:
+                raise serializers.ValidationError('Invalid agent connection credentials or keys')
+        except serializers.ValidationError as e:
+            print(str(e))
+            return Response(status=400, data=str(e).encode())
+        else:
+            return self.build_response(request, credentials)
+
+    async def aget(self, request, *args, **kwargs):
+        if not (request.user and request.user.is_authenticated):
+            return HttpResponseRedirect(redirect_to=reverse('auth'))
+        try:
+            credentials, monitored = self.load_credentials(request)
+            try:
+                if monitored:
+                    health = await database_sync_to_async(get_agent_health)() or await check_agent_health()
+                    assert health['alive'] is True
+                else:
+                    await self.check_agent_credentials(credentials)
+            except Exception as e:
+                raise serializers.ValidationError('Invalid agent connection credentials or keys')
+        except serializers.ValidationError as e:
+            print(str(e))
+            return Response(status=400, data=str(e).encode())
+        else:
+            return await database_sync_to_async(self.build_response)(request, credentials)
+
+    @staticmethod
+    def load_credentials(request) -> (dict, bool):
+        """Agent credentials from query params with fallback to settings
+
+        :return: credentials, True if credentials are of agent tracked by health monitor
+        """
         params = {k: v for k, v in request.query_params.items()}
         params_from_settings = dict(
             credentials=settings.AGENT['credentials'],
@@ -174,79 +218,71 @@ class TransactionsView(APIView):
         for k, v in params_from_settings.items():
             params[k] = params.get(k, None) or v
         ser = AgentCredentialsSerializer(data=params)
-        try:
-            ser.is_valid(raise_exception=True)
-            try:
-                credentials = ser.create(ser.validated_data)
-                run_async(self.check_agent_credentials(credentials))
-            except Exception as e:
-                raise serializers.ValidationError('Invalid agent connection credentials or keys')
-        except serializers.ValidationError as e:
-            print(str(e))
-            return Response(status=400, data=str(e).encode())
+        ser.is_valid(raise_exception=True)
+        credentials = ser.create(ser.validated_data)
+        return credentials, all(params[k] == v for k, v in params_from_settings.items())
+
+    @staticmethod
+    def build_response(request, credentials: dict) -> Response:
+        entity = credentials['entity']
+        if settings.AGENT['is_sea']:
+            doc_types = {
+                'default': 'Сonnaissement',
+                'values': [
+                    {'id': 'Сonnaissement', 'caption': 'Коносамент'},
+                    {'id': 'Manifest', 'caption': 'Манифест'},
+                    {'id': 'CargoPlan', 'caption': 'Грузовой план'},
+                    {'id': 'LogisticInfo', 'caption': 'Перевозочная информация'}
+                ]
+            }
         else:
-            entity = credentials['entity']
-            if settings.AGENT['is_sea']:
-                doc_types = {
-                    'default': 'Сonnaissement',
-                    'values': [
-                        {'id': 'Сonnaissement', 'caption': 'Коносамент'},
-                        {'id': 'Manifest', 'caption': 'Манифест'},
-                        {'id': 'CargoPlan', 'caption': 'Грузовой план'},
-                        {'id': 'LogisticInfo', 'caption': 'Перевозочная информация'}
-                    ]
-                }
-            else:
-                doc_types = {
-                    'default': 'WayBill',
-                    'values': [
-                        {'id': 'WayBill', 'caption': 'СМГС Накладная'},
-                        {'id': 'Invoice', 'caption': 'Инвойс'},
-                        {'id': 'PackList', 'caption': 'Упаковочный лист'},
-                        {'id': 'QualityPassport', 'caption': 'Паспорт качества'},
-                        {'id': 'GoodsDeclaration', 'caption': 'Декларация на товары'},
-                        {'id': 'WayBillRelease', 'caption': 'Накладная на отпуск запасов на сторону'}
-                    ]
-                }
-            curr_abs_url = request.build_absolute_uri()
-            parts = urlsplit(curr_abs_url)
-            is_secure = request.is_secure()
-            logging.error('-----------------')
-            logging.error('parts.scheme: ' + parts.scheme)
-            logging.error('is_secure: ' + str(is_secure))
-            logging.error('curr_abs_url: ' + curr_abs_url)
-            logging.error('parts.netloc: ' + str(parts.netloc))
-            logging.error('-----------------')
-            ws_url = 'wss://' if is_secure else 'ws://'
-            ws_url += parts.netloc + '/transactions'
-            token = Token.allocate(request.user).value
-            ws_url += '?token=%s' % token
-            menu = calc_menu(request)
-            menu[-1]['enabled'] = request.user.is_superuser
-
-            ledgers = build_all_ledgers()
-            map_ledgers = {item['id']: item for item in ledgers}
-            approaching_num = 0
-            for ledger in ledgers:
-                if ledger['approaching']:
-                    approaching_num += 1
-
-            return Response(data={
-                'menu': menu,
-                'active_menu_index': 0,
-                'ledgers': ledgers,
-                'map_ledgers': map_ledgers,
-                'approaching_num': approaching_num,
-                'logo': '/static/logos/%s' % settings.PARTICIPANTS_META[entity]['logo'],
-                'label': settings.PARTICIPANTS_META[entity]['label'],
-                'cur_date': str(timezone.datetime.now().strftime('%d.%m.%Y')),
-                'upload_url': str(reverse('upload')),
-                'doc_types': doc_types,
-                'ws_url': ws_url,
-                'smart_contract_init_ledger_url': str(reverse('smart-contract-init-ledger')),
-                'smart_contract_commit_txns_url': str(reverse('smart-contract-commit-txns')),
-                'enable_parallel_txns':  settings.ENABLE_PARALLEL_TXNS
-            })
+            doc_types = {
+                'default': 'WayBill',
+                'values': [
+                    {'id': 'WayBill', 'caption': 'СМГС Накладная'},
+                    {'id': 'Invoice', 'caption': 'Инвойс'},
+                    {'id': 'PackList', 'caption': 'Упаковочный лист'},
+                    {'id': 'QualityPassport', 'caption': 'Паспорт качества'},
+                    {'id': 'GoodsDeclaration', 'caption': 'Декларация на товары'},
+                    {'id': 'WayBillRelease', 'caption': 'Накладная на отпуск запасов на сторону'}
+                ]
+            }
+        curr_abs_url = request.build_absolute_uri()
+        parts = urlsplit(curr_abs_url)
+        is_secure = request.is_secure()
+        logging.error('-----------------')
+        logging.error('parts.scheme: ' + parts.scheme)
+        logging.error('is_secure: ' + str(is_secure))
+        logging.error('curr_abs_url: ' + curr_abs_url)
+        logging.error('parts.netloc: ' + str(parts.netloc))
+        logging.error('-----------------')
+        ws_url = 'wss://' if is_secure else 'ws://'
+        ws_url += parts.netloc + '/transactions'
+        token = Token.allocate(request.user).value
+        ws_url += '?token=%s' % token
+        menu = calc_menu(request)
+        menu[-1]['enabled'] = request.user.is_superuser
+
+        ledgers = build_all_ledgers()
+        map_ledgers = {item['id']: item for item in ledgers}
+        approaching_num = count_inbox_ledgers()
+
+        return Response(data={
+            'menu': menu,
+            'active_menu_index': 0,
+            'ledgers': ledgers,
+            'map_ledgers': map_ledgers,
+            'approaching_num': approaching_num,
+            'logo': '/static/logos/%s' % settings.PARTICIPANTS_META[entity]['logo'],
+            'label': settings.PARTICIPANTS_META[entity]['label'],
+            'cur_date': str(timezone.datetime.now().strftime('%d.%m.%Y')),
+            'upload_url': str(reverse('upload')),
+            'doc_types': doc_types,
+            'ws_url': ws_url,
+            'smart_contract_init_ledger_url': str(reverse('smart-contract-init-ledger')),
+            'smart_contract_commit_txns_url': str(reverse('smart-contract-commit-txns')),
+            'enable_parallel_txns':  settings.ENABLE_PARALLEL_TXNS
+        })
 
     @staticmethod
     async def check_agent_credentials(credentials: dict):
@@ -323,70 +359,154 @@ class UserCreationView(APIView):
 
     @staticmethod
     async def create_cred_issue_qr(username: str):
-        model = CredentialQR.objects.filter(username=username).first()
-        if model is None:
-            async with get_connection() as agent:
-                entity = settings.AGENT['entity']
-                endpoint_address = [e for e in agent.endpoints if e.routing_keys == []][0].address
-                connection_key = await agent.wallet.crypto.create_key()
-                invitation = Invitation(
-                    label=settings.PARTICIPANTS_META[entity]['label'],
-                    endpoint=endpoint_address,
-                    recipient_keys=[connection_key]
-                )
-                invitation['did'] = entity
-                url = await agent.generate_qr_code(invitation.invitation_url)
-                my_endpoint = {
-                    'address': endpoint_address,
-                    'routing_keys': []
-                }
-                qr, _ = QRCode.objects.get_or_create(connection_key=connection_key, url=url, my_endpoint=my_endpoint)
-                model = CredentialQR.objects.create(username=username, qr=qr)
+        exists = await database_sync_to_async(CredentialQR.objects.filter(username=username).exists)()
+        if not exists:
+            qr = await database_sync_to_async(QRCode.claim)()
+            if qr is None:
+                async with get_connection() as agent:
+                    qr = await create_invitation_qr(agent)
+            await database_sync_to_async(CredentialQR.objects.create)(username=username, qr=qr)
 
     def post(self, request, *args, **kwargs):
-        ser = CreateAccountSerializer(data=request.data)
-        errors = {}
+        params, errors = self.validate(request.data)
+        account = None
+        if not errors:
+            if self.user_exists(params['username']):
+                errors['username'] = 'User already exists'
+            else:
+                run_async(self.create_cred_issue_qr(username=params['username']))
+                account = self.create_account(params)
+        return Response(data=self.build_response_data(errors, account))
+
+    async def apost(self, request, *args, **kwargs):
+        params, errors = self.validate(request.data)
         account = None
+        if not errors:
+            account, errors = await self.provision_account(params)
+        return Response(data=self.build_response_data(errors, account))
+
+    @staticmethod
+    async def provision_account(params: dict) -> (Optional[dict], dict):
+        """Create account with credentials QR code
+
+        :return: account, errors
+        """
+        if await database_sync_to_async(UserCreationView.user_exists)(params['username']):
+            return None, {'username': 'User already exists'}
+        await UserCreationView.create_cred_issue_qr(username=params['username'])
+        account = await database_sync_to_async(UserCreationView.create_account)(params)
+        return account, {}
+
+    @staticmethod
+    def validate(data) -> (dict, dict):
+        ser = CreateAccountSerializer(data=data)
+        errors = {}
         try:
             ser.is_valid(raise_exception=True)
         except serializers.ValidationError as e:
             for k, v in e.get_full_details().items():
                 errors[k] = str(v[0]['message'])
-        params = ser.create(ser.validated_data)
-        if not errors:
-            user = User.objects.filter(
-                username=params['username'],
-                entities__entity=settings.AGENT['entity']
-            ).first()
-            if user:
-                errors['username'] = 'User already exists'
-            else:
-                try:
-                    run_async(self.create_cred_issue_qr(username=params['username']))
-                    user = User.objects.create(
-                        username=params['username'],
-                        first_name=params.get('first_name', None) or '',
-                        last_name=params.get('last_name', None) or '',
-                    )
-                    user.set_password(params['password'])
-                    user.save()
-                    UserEntityBind.objects.create(user=user, entity=settings.AGENT['entity'])
-                except Exception as e:
-                    raise
-                account = {'username': user.username, 'first_name': user.first_name, 'last_name': user.last_name}
+        return ser.create(ser.validated_data), errors
+
+    @staticmethod
+    def user_exists(username: str) -> bool:
+        return User.objects.filter(
+            username=username,
+            entities__entity=settings.AGENT['entity']
+        ).exists()
+
+    @staticmethod
+    def create_account(params: dict) -> dict:
+        user = User.objects.create(
+            username=params['username'],
+            first_name=params.get('first_name', None) or '',
+            last_name=params.get('last_name', None) or '',
+        )
+        user.set_password(params['password'])
+        user.save()
+        UserEntityBind.objects.create(user=user, entity=settings.AGENT['entity'])
+        return {'username': user.username, 'first_name': user.first_name, 'last_name': user.last_name}
+
+    @staticmethod
+    def build_response_data(errors: dict, account: dict = None) -> dict:
         if errors:
-            data = {
+            return {
                 'errors': errors,
                 'success': False,
                 'account': account
             }
         else:
-            data = {
+            return {
                 'errors': None,
                 'success': True,
                 'account': account
             }
-        return Response(data=data)
+
+
+class UserImportView(APIView):
+    """Bulk accounts import: {"accounts": [{"username", "password", "first_name", "last_name"}, ...]}
+
+    Accounts are provisioned concurrently, response reports result for every account in order of request.
+    """
+    renderer_classes = [JSONRenderer]
+    permission_classes = [IsSuperUser]
+
+    def post(self, request, *args, **kwargs):
+        results = run_async(
+            self.provision_accounts(self.load_accounts(request.data)), timeout=settings.USER_IMPORT_TIMEOUT
+        )
+        return Response(data=self.build_response_data(results))
+
+    async def apost(self, request, *args, **kwargs):
+        results = await self.provision_accounts(self.load_accounts(request.data))
+        return Response(data=self.build_response_data(results))
+
+    @staticmethod
+    def load_accounts(data) -> List[dict]:
+        accounts = data.get('accounts', None) if isinstance(data, dict) else data
+        if not isinstance(accounts, list) or not all(isinstance(item, dict) for item in accounts):
+            raise exceptions.ValidationError('Expected list of accounts')
+        return accounts
+
+    @staticmethod
+    async def provision_accounts(accounts: List[dict], on_progress: Callable[[dict], None] = None) -> List[dict]:
+        """Provision accounts concurrently, at most USER_IMPORT_CONCURRENCY at once
+
+        :param on_progress: called with result of every account as soon as it is processed
+        :return: results in order of accounts
+        """
+        semaphore = asyncio.Semaphore(settings.USER_IMPORT_CONCURRENCY)
+        usernames = set()
+
+        async def provision(data: dict) -> dict:
+            params, errors = UserCreationView.validate(data)
+            username = params.get('username', None) or data.get('username', None)
+            if not errors and username in usernames:
+                errors['username'] = 'Duplicate username'
+            usernames.add(username)
+            account = None
+            if not errors:
+                async with semaphore:
+                    try:
+                        account, errors = await UserCreationView.provision_account(params)
+                    except Exception as e:
+                        logging.error('Exception while provision account %s: %s' % (username, repr(e)))
+                        errors = {'account': str(e) or repr(e)}
+            result = dict(username=username, **UserCreationView.build_response_data(errors, account))
+            if on_progress:
+                on_progress(result)
+            return result
+
+        return list(await asyncio.gather(*[provision(data) for data in accounts]))
+
+    @staticmethod
+    def build_response_data(results: List[dict]) -> dict:
+        created = len([result for result in results if result['success']])
+        return {
+            'created': created,
+            'failed': len(results) - created,
+            'results': results
+        }
 
 
 class GUSerializer(serializers.ModelSerializer):
@@ -474,27 +594,45 @@ class BaseGUView(APIView):
         })
 
     def post(self, request, *args, **kwargs):
-        ser = GUCreateSerializer(data=request.data)
-        errors = None
+        fields, errors = self.validate(request.data)
+        if errors:
+            return Response({'success': False, 'errors': errors})
+        _, delivery = self.create_record(**fields)
+        return Response({'success': True, 'errors': errors, 'delivery': delivery})
+
+    async def apost(self, request, *args, **kwargs):
+        fields, errors = self.validate(request.data)
+        if errors:
+            return Response({'success': False, 'errors': errors})
+        _, txn = await database_sync_to_async(self.store_record)(**fields)
+        delivery = await asyncio.wait_for(self.emit(txn), timeout=settings.BROADCAST_TIMEOUT + 5)
+        return Response({'success': True, 'errors': errors, 'delivery': delivery})
+
+    @staticmethod
+    def validate(data) -> (dict, dict):
+        ser = GUCreateSerializer(data=data)
         try:
             ser.is_valid(raise_exception=True)
-            fields = ser.create(ser.validated_data)
-            attachments = fields.get('attachments', None)
-            if attachments:
-                fields['attachments'] = json.loads(attachments)
-            else:
-                fields['attachments'] = []
-            self.create_record(**fields)
         except serializers.ValidationError as e:
             errors = {}
             for k, v in e.get_full_details().items():
                 errors[k] = str(v[0]['message'])
-        if errors:
-            return Response({'success': False, 'errors': errors})
+            return None, errors
+        fields = ser.create(ser.validated_data)
+        attachments = fields.get('attachments', None)
+        if attachments:
+            fields['attachments'] = json.loads(attachments)
         else:
-            return Response({'success': True, 'errors': errors})
+            fields['attachments'] = []
+        return fields, None
 
-    def create_record(self, **fields) -> GURecord:
+    def create_record(self, **fields) -> (GURecord, Dict[str, dict]):
+        record, txn = self.store_record(**fields)
+        delivery = run_async(self.emit(txn), timeout=settings.BROADCAST_TIMEOUT + 5)
+        return record, delivery
+
+    def store_record(self, **fields) -> (GURecord, dict):
+        """Save record and build transaction to be emitted to participants"""
         record = GURecord.objects.create(
             entity=settings.AGENT['entity'],
             category=self.get_category(),
@@ -531,24 +669,11 @@ class BaseGUView(APIView):
                     item['mime_type'] = mime_type
                 collection.append(item)
             txn['~attach'] = collection
-        run_async(self.emit(txn))
-        return record
+        return record, txn
 
     @staticmethod
-    async def emit(txn: dict):
-        async with get_connection() as agent:
-            entity = settings.AGENT['entity']
-            participants_dids = [did for did in settings.PARTICIPANTS_META.keys() if did != entity]
-            for did in participants_dids:
-                to = await agent.pairwise_list.load_for_did(did)
-                if to:
-                    msg = Message(txn)
-                    print(f'============ SEND message to DID: {did}  =======')
-                    print(json.dumps(msg, indent=2, sort_keys=True))
-                    print('================================================')
-                    await agent.send_to(msg, to)
-                else:
-                    print('Empty pairwise for DID: ' + did)
+    async def emit(txn: dict) -> Dict[str, dict]:
+        return await broadcast(txn)
 
     def get_active_menu_index(self):
         raise NotImplemented
@@ -629,12 +754,28 @@ class CredentialsView(APIView):
     def get(self, request, *args, **kwargs):
         if not (request.user and request.user.is_authenticated):
             return HttpResponseRedirect(redirect_to=reverse('auth'))
-        menu = calc_menu(request)
-        cred_qr = CredentialQR.objects.filter(username=request.user.username).first()
+        cred_qr = self.load_cred_qr(request.user.username)
         if cred_qr is None:
             run_async(UserCreationView.create_cred_issue_qr(request.user.username))
-        cred_qr = CredentialQR.objects.get(username=request.user.username)
+            cred_qr = self.load_cred_qr(request.user.username)
+        return self.build_response(request, cred_qr)
+
+    async def aget(self, request, *args, **kwargs):
+        if not (request.user and request.user.is_authenticated):
+            return HttpResponseRedirect(redirect_to=reverse('auth'))
+        cred_qr = await database_sync_to_async(self.load_cred_qr)(request.user.username)
+        if cred_qr is None:
+            await UserCreationView.create_cred_issue_qr(request.user.username)
+            cred_qr = await database_sync_to_async(self.load_cred_qr)(request.user.username)
+        return await database_sync_to_async(self.build_response)(request, cred_qr)
+
+    @staticmethod
+    def load_cred_qr(username: str):
+        return CredentialQR.objects.filter(username=username).select_related('qr').first()
 
+    @staticmethod
+    def build_response(request, cred_qr: CredentialQR) -> Response:
+        menu = calc_menu(request)
         curr_abs_url = request.build_absolute_uri()
         parts = urlsplit(curr_abs_url)
         is_secure = request.is_secure()
@@ -690,8 +831,35 @@ class AuthView(APIView):
             return HttpResponseRedirect(redirect_to=reverse('index'))
         if request.user.is_authenticated:
             return HttpResponseRedirect(redirect_to=reverse('transactions'))
+        qr = self.validate_qr_cookie(request)
+        if not qr:
+            qr = self.claim_invitation_qr()
+        if not qr:
+            qr = run_async(
+                self.generate_invitation_qr()
+            )
+        return self.build_response(request, qr)
+
+    async def aget(self, request, *args, **kwargs):
+        if not settings.AGENT['entity']:
+            return HttpResponseRedirect(redirect_to=reverse('index'))
+        if request.user.is_authenticated:
+            return HttpResponseRedirect(redirect_to=reverse('transactions'))
+        qr = await database_sync_to_async(self.validate_qr_cookie)(request)
+        if not qr:
+            qr = await database_sync_to_async(self.claim_invitation_qr)()
+        if not qr:
+            qr = await self.generate_invitation_qr()
+        return self.build_response(request, qr)
+
+    @staticmethod
+    def validate_qr_cookie(request):
+        """QR url from cookies if it is still usable, None otherwise. Positive result is cached"""
         qr = request.COOKIES.get('qr', None)
         if qr:
+            cache_key = get_qr_cache_key(qr)
+            if cache.get(cache_key):
+                return qr
             resp = request_get(qr)
             if resp.status_code != 200:
                 QRCode.objects.filter(url=qr).all().delete()
@@ -703,10 +871,19 @@ class AuthView(APIView):
                 elif not qr_model.my_endpoint:
                     QRCode.objects.filter(url=qr).all().delete()
                     qr = None
-        if not qr:
-            qr = run_async(
-                self.generate_invitation_qr()
-            )
+            if qr:
+                cache.set(cache_key, True, settings.QR_VALIDATION_CACHE_TTL)
+        return qr
+
+    @staticmethod
+    def claim_invitation_qr():
+        """QR url of pre-generated invitation, None if pool is empty"""
+        if not settings.AGENT['entity']:
+            return None
+        qr = QRCode.claim()
+        return qr.url if qr else None
+
+    def build_response(self, request, qr: str) -> Response:
         data = self.get_response_data(request)
         data['qr'] = qr
         resp = Response(data=data)
@@ -766,21 +943,8 @@ class AuthView(APIView):
         if not entity:
             return None
         async with get_connection() as agent:
-            endpoint_address = [e for e in agent.endpoints if e.routing_keys == []][0].address
-            connection_key = await agent.wallet.crypto.create_key()
-            invitation = Invitation(
-                label=settings.PARTICIPANTS_META[entity]['label'],
-                endpoint=endpoint_address,
-                recipient_keys=[connection_key]
-            )
-            invitation['did'] = entity
-            url = await agent.generate_qr_code(invitation.invitation_url)
-            my_endpoint = {
-                'address': endpoint_address,
-                'routing_keys': []
-            }
-            QRCode.objects.get_or_create(connection_key=connection_key, url=url, my_endpoint=my_endpoint)
-            return url
+            qr = await create_invitation_qr(agent)
+            return qr.url
 
 
 class AuthByRefView(APIView):
@@ -1,25 +1,71 @@
+import hmac
+import hashlib
+
 from rest_framework.authentication import BasicAuthentication as DefaultBasicAuthentication
 from rest_framework import exceptions
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 
 
+def get_credentials_cache_key(userid: str, password: str) -> str:
+    """Cache key of verified credentials, plain password never leaves process"""
+    digest = hmac.new(
+        settings.SECRET_KEY.encode(),
+        ('%s:%s:%s' % (settings.AGENT['entity'], userid, password)).encode(),
+        hashlib.sha256
+    ).hexdigest()
+    return 'auth:basic:' + digest
+
+
+def get_credentials_digest(password: str, password_hash: str) -> str:
+    """Proof of verified password bound to current password hash, so cache never keeps the hash itself
+    and entry doesn't match anymore when password is changed"""
+    return hmac.new(
+        settings.SECRET_KEY.encode(),
+        ('%s:%s' % (password, password_hash)).encode(),
+        hashlib.sha256
+    ).hexdigest()
+
+
 class ExtendedBasicAuthentication(DefaultBasicAuthentication):
 
     def authenticate_credentials(self, userid, password, request=None):
-        user = User.objects.filter(
-            username=userid,
-            entities__entity=settings.AGENT['entity']
-        ).first()
-
-        if user and not user.check_password(password):
-            user = None
+        cache_key = get_credentials_cache_key(userid, password)
+        user = self.load_verified_user(cache_key, password)
 
         if user is None:
-            raise exceptions.AuthenticationFailed(_('Invalid username/password.'))
+            user = User.objects.filter(
+                username=userid,
+                entities__entity=settings.AGENT['entity']
+            ).first()
+
+            if user and not user.check_password(password):
+                user = None
+
+            if user is None:
+                raise exceptions.AuthenticationFailed(_('Invalid username/password.'))
 
-        if not user.is_active:
-            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+            if not user.is_active:
+                raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+            cache.set(
+                cache_key, (user.pk, get_credentials_digest(password, user.password)), settings.BASIC_AUTH_CACHE_TTL
+            )
 
         return user, None
+
+    @staticmethod
+    def load_verified_user(cache_key: str, password: str):
+        cached = cache.get(cache_key)
+        if cached is None:
+            return None
+        user_id, digest = cached
+        user = User.objects.filter(pk=user_id, entities__entity=settings.AGENT['entity']).first()
+        if user and user.is_active and hmac.compare_digest(get_credentials_digest(password, user.password), digest):
+            return user
+        else:
+            # password was changed, user was deactivated or unbound from entity
+            cache.delete(cache_key)
+            return None
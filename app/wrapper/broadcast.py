@@ -0,0 +1,80 @@
+import time
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from sirius_sdk import Pairwise
+from sirius_sdk.messaging import Message
+
+from .pool import get_connection
+
+
+_pairwise_cache: Dict[str, Tuple[Pairwise, float]] = {}
+
+
+def get_neighbours() -> List[str]:
+    entity = settings.AGENT['entity']
+    return [did for did in settings.PARTICIPANTS_META.keys() if did != entity]
+
+
+async def load_pairwise_list(dids: List[str]) -> Dict[str, Optional[Pairwise]]:
+    """Resolve pairwise for every DID, recently resolved ones are taken from cache"""
+    now = time.monotonic()
+    resolved = {}
+    missing = []
+    for did in dids:
+        cached = _pairwise_cache.get(did)
+        if cached and now - cached[1] < settings.PAIRWISE_CACHE_TTL:
+            resolved[did] = cached[0]
+        else:
+            missing.append(did)
+    if missing:
+        async with get_connection() as agent:
+            for did in missing:
+                pairwise = await agent.pairwise_list.load_for_did(did)
+                if pairwise:
+                    _pairwise_cache[did] = (pairwise, now)
+                resolved[did] = pairwise
+    return resolved
+
+
+def forget_pairwise(did: str):
+    _pairwise_cache.pop(did, None)
+
+
+async def broadcast(message: dict, dids: List[str] = None, timeout: float = None) -> Dict[str, dict]:
+    """Send message to participants concurrently
+
+    :param message: message to send
+    :param dids: recipients, all neighbours by default
+    :param timeout: per-target delivery timeout
+    :return: delivery result for every recipient: {did: {'success': bool, 'error': str or None}}
+    """
+    dids = get_neighbours() if dids is None else dids
+    timeout = timeout or settings.BROADCAST_TIMEOUT
+    msg = Message(message)
+    pairwise_list = await load_pairwise_list(dids)
+
+    async def send(did: str) -> dict:
+        to = pairwise_list.get(did)
+        if to is None:
+            return dict(success=False, error='Empty pairwise')
+        try:
+            async with get_connection() as agent:
+                await asyncio.wait_for(agent.send_to(msg, to), timeout)
+        except asyncio.TimeoutError:
+            forget_pairwise(did)
+            return dict(success=False, error='Timeout')
+        except Exception as e:
+            forget_pairwise(did)
+            return dict(success=False, error=str(e) or repr(e))
+        else:
+            return dict(success=True, error=None)
+
+    results = await asyncio.gather(*[send(did) for did in dids])
+    delivery = dict(zip(dids, results))
+    for did, result in delivery.items():
+        if not result['success']:
+            logging.error('Broadcast: delivery to DID %s failed: %s' % (did, result['error']))
+    return delivery
@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import weakref
+from contextlib import asynccontextmanager
+from typing import Dict, Set, List, Optional, AsyncIterator
+
+from django.conf import settings
+from sirius_sdk.agent.listener import Event
+from sirius_sdk.agent.aries_rfc.feature_0160_connection_protocol import ConnRequest
+
+from .pool import get_dedicated_connection
+
+
+class ConnRequestRouter:
+    """Single agent events subscription shared by consumers waiting for connection requests.
+
+    Subscription is opened with the first registered consumer and closed with the last one.
+    ConnRequest events are routed by recipient_verkey (connection key of invitation) to
+    queues of consumers registered for this key, so cost doesn't depend on number of waiting users.
+
+        async with router.listen(connection_key) as events:
+            async for event in events:
+                ...
+    """
+
+    def __init__(self, reconnect_interval: float):
+        self.__reconnect_interval = reconnect_interval
+        self.__routes: Dict[str, Set[asyncio.Queue]] = {}
+        self.__listener: Optional[asyncio.Future] = None
+        self.__counters = dict(received=0, routed=0, dropped=0, reconnects=0)
+
+    @asynccontextmanager
+    async def listen(self, connection_key: str):
+        queue = asyncio.Queue()
+        self.__routes.setdefault(connection_key, set()).add(queue)
+        if self.__listener is None or self.__listener.done():
+            self.__listener = asyncio.ensure_future(self.__listen())
+        try:
+            yield self.__iterate(queue)
+        finally:
+            queues = self.__routes.get(connection_key, set())
+            queues.discard(queue)
+            if not queues:
+                self.__routes.pop(connection_key, None)
+            if not self.__routes and self.__listener is not None:
+                self.__listener.cancel()
+                self.__listener = None
+
+    def metrics(self) -> dict:
+        return dict(
+            connection_keys=len(self.__routes),
+            consumers=sum(len(queues) for queues in self.__routes.values()),
+            subscribed=self.__listener is not None and not self.__listener.done(),
+            **self.__counters
+        )
+
+    @staticmethod
+    async def __iterate(queue: asyncio.Queue) -> AsyncIterator[Event]:
+        while True:
+            yield await queue.get()
+
+    async def __listen(self):
+        while True:
+            try:
+                async with get_dedicated_connection() as agent:
+                    listener = await agent.subscribe()
+                    async for event in listener:
+                        self.__counters['received'] += 1
+                        if isinstance(event.message, ConnRequest):
+                            queues = self.__routes.get(event.recipient_verkey)
+                            if queues:
+                                for queue in queues:
+                                    queue.put_nowait(event)
+                                self.__counters['routed'] += 1
+                            else:
+                                self.__counters['dropped'] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.__counters['reconnects'] += 1
+                logging.error('ConnRequest router: subscription terminated with exception: ' + repr(e))
+                await asyncio.sleep(self.__reconnect_interval)
+
+
+_routers = weakref.WeakKeyDictionary()
+
+
+def get_conn_request_router() -> ConnRequestRouter:
+    """Router of current event loop"""
+    loop = asyncio.get_event_loop()
+    if loop not in _routers:
+        _routers[loop] = ConnRequestRouter(reconnect_interval=settings.CONN_REQUESTS_RECONNECT_INTERVAL)
+    return _routers[loop]
+
+
+def get_conn_request_routers_metrics() -> List[dict]:
+    return [router.metrics() for router in list(_routers.values())]
@@ -0,0 +1,121 @@
+import time
+import asyncio
+import logging
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from channels.db import database_sync_to_async
+from sirius_sdk.agent.aries_rfc.feature_0048_trust_ping import Ping
+
+from .pool import get_agent_pool, AgentPoolBusy
+from .broadcast import get_neighbours, load_pairwise_list, forget_pairwise
+
+
+async def check_agent_health() -> dict:
+    """Ping agent and store status in cache
+
+    Connections of pool may be held by smart-contracts for whole consensus. If none is released in
+    AGENT_HEALTH_TIMEOUT agent is reported alive but degraded: it is busy, not broken.
+
+    :return: {'alive': bool, 'degraded': bool, 'rtt_ms': float, 'checked': timestamp, 'last_alive': timestamp, 'error': str}
+    """
+    previous = await database_sync_to_async(cache.get)(settings.AGENT_HEALTH_CACHE_KEY) or {}
+    stamp = time.time()
+    error = None
+    degraded = False
+    try:
+        async with get_agent_pool().connection(timeout=settings.AGENT_HEALTH_TIMEOUT) as agent:
+            ok = await asyncio.wait_for(agent.ping(), settings.AGENT_HEALTH_TIMEOUT)
+        if ok is not True:
+            error = 'Agent ping failed'
+    except AgentPoolBusy:
+        degraded = True
+    except asyncio.TimeoutError:
+        error = 'Timeout'
+    except Exception as e:
+        error = str(e) or repr(e)
+    checked = time.time()
+    status = dict(
+        alive=error is None,
+        degraded=degraded,
+        rtt_ms=round(1000 * (checked - stamp), 2) if not degraded else None,
+        checked=checked,
+        last_alive=checked if error is None and not degraded else previous.get('last_alive'),
+        error='All agent connections are busy' if degraded else error
+    )
+    await database_sync_to_async(cache.set)(settings.AGENT_HEALTH_CACHE_KEY, status, None)
+    return status
+
+
+async def probe_participants() -> dict:
+    """Ping neighbours concurrently and store reachability in cache
+
+    RTT is time of Ping delivery to participant endpoint.
+    :return: {did: {'label', 'reachable', 'rtt_ms', 'checked', 'last_seen', 'error'}}
+    """
+    previous = await database_sync_to_async(cache.get)(settings.PARTICIPANTS_HEALTH_CACHE_KEY) or {}
+    dids = get_neighbours()
+    ping = Ping(comment='health:%s' % time.time())
+
+    async def probe(did: str) -> dict:
+        stamp = time.time()
+        error = None
+        try:
+            pairwise_list = await load_pairwise_list([did])
+            to = pairwise_list.get(did)
+            if to is None:
+                error = 'Empty pairwise'
+            else:
+                async with get_agent_pool().connection(timeout=settings.AGENT_HEALTH_TIMEOUT) as agent:
+                    await asyncio.wait_for(agent.send_to(ping, to), settings.AGENT_HEALTH_TIMEOUT)
+        except AgentPoolBusy:
+            # reachability is unknown while pool is busy, previous result is kept
+            return dict(
+                previous.get(did) or dict(
+                    label=settings.PARTICIPANTS_META.get(did, {}).get('label'),
+                    reachable=None, rtt_ms=None, checked=None, last_seen=None
+                ),
+                error='All agent connections are busy'
+            )
+        except asyncio.TimeoutError:
+            error = 'Timeout'
+        except Exception as e:
+            error = str(e) or repr(e)
+        if error:
+            forget_pairwise(did)
+        checked = time.time()
+        return dict(
+            label=settings.PARTICIPANTS_META.get(did, {}).get('label'),
+            reachable=error is None,
+            rtt_ms=round(1000 * (checked - stamp), 2) if error is None else None,
+            checked=checked,
+            last_seen=checked if error is None else previous.get(did, {}).get('last_seen'),
+            error=error
+        )
+
+    results = await asyncio.gather(*[probe(did) for did in dids])
+    statuses = dict(zip(dids, results))
+    await database_sync_to_async(cache.set)(settings.PARTICIPANTS_HEALTH_CACHE_KEY, statuses, None)
+    return statuses
+
+
+async def run_health_monitor():
+    while True:
+        status, _ = await asyncio.gather(check_agent_health(), probe_participants())
+        if not status['alive']:
+            logging.error('Health monitor: agent is not alive: %s' % status['error'])
+        await asyncio.sleep(settings.AGENT_HEALTH_CHECK_INTERVAL)
+
+
+def get_agent_health() -> Optional[dict]:
+    """Agent status recently stored by health monitor, None if status is unknown or stale"""
+    status = cache.get(settings.AGENT_HEALTH_CACHE_KEY)
+    if status and time.time() - status['checked'] < 3 * settings.AGENT_HEALTH_CHECK_INTERVAL:
+        return status
+    else:
+        return None
+
+
+def get_participants_health() -> dict:
+    return cache.get(settings.PARTICIPANTS_HEALTH_CACHE_KEY) or {}
@@ -0,0 +1,28 @@
+# Generated by Django 2.2 on 2026-10-18 08:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wrapper', '0015_transaction_actor_entity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerSummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity', models.CharField(db_index=True, max_length=64, null=True)),
+                ('signer_did', models.CharField(db_index=True, max_length=64, null=True)),
+                ('status', models.CharField(db_index=True, max_length=36, null=True)),
+                ('approaching', models.BooleanField(db_index=True, default=False)),
+                ('updated', models.DateTimeField(auto_now=True, db_index=True)),
+                ('first_txn', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='wrapper.Transaction')),
+                ('last_txn', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='wrapper.Transaction')),
+                ('ledger', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='summary', to='wrapper.Ledger')),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2 on 2026-10-18 09:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wrapper', '0016_ledgersummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='content',
+            name='ref_count',
+            field=models.IntegerField(default=1),
+        ),
+        migrations.AlterField(
+            model_name='content',
+            name='md5',
+            field=models.CharField(db_index=True, max_length=128, null=True),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 2.2 on 2026-10-18 09:31
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('wrapper', '0017_content_ref_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('uid', models.CharField(max_length=128, primary_key=True, serialize=False)),
+                ('entity', models.CharField(db_index=True, max_length=1024, null=True)),
+                ('name', models.CharField(max_length=512)),
+                ('content_type', models.CharField(max_length=1024, null=True)),
+                ('size', models.BigIntegerField(null=True)),
+                ('offset', models.BigIntegerField(default=0)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True, db_index=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
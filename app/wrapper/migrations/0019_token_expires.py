@@ -0,0 +1,18 @@
+# Generated by Django 2.2 on 2026-10-18 10:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wrapper', '0018_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='token',
+            name='expires',
+            field=models.DateTimeField(db_index=True, null=True),
+        ),
+    ]
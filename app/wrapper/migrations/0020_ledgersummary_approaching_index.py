@@ -0,0 +1,17 @@
+# Generated by Django 2.2 on 2026-10-18 11:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wrapper', '0019_token_expires'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ledgersummary',
+            index=models.Index(fields=['entity', 'approaching'], name='wrapper_led_entity_d85cd2_idx'),
+        ),
+    ]
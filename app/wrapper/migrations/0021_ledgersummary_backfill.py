@@ -0,0 +1,50 @@
+# Generated by Django 2.2 on 2026-10-18 13:05
+
+from django.db import migrations
+from django.db.models import Min, Max
+
+from wrapper.utils import get_approaching_entities, get_txn_signer_verkey, resolve_signer_did, get_txn_status
+
+
+BATCH_SIZE = 500
+
+
+def backfill_summaries(apps, schema_editor):
+    """Create summaries of ledgers stored before LedgerSummary was introduced, once instead of every start"""
+    Ledger = apps.get_model('wrapper', 'Ledger')
+    Transaction = apps.get_model('wrapper', 'Transaction')
+    LedgerSummary = apps.get_model('wrapper', 'LedgerSummary')
+    approaching_entities = get_approaching_entities()
+    rows = list(
+        Ledger.objects.filter(summary__isnull=True).annotate(
+            first_id=Min('transaction__id'), last_id=Max('transaction__id')
+        ).order_by('id').values_list('id', 'entity', 'first_id', 'last_id')
+    )
+    for start in range(0, len(rows), BATCH_SIZE):
+        batch = rows[start:start + BATCH_SIZE]
+        last_txns = Transaction.objects.in_bulk([last_id for _, _, _, last_id in batch if last_id])
+        summaries = []
+        for ledger_id, entity, first_id, last_id in batch:
+            summary = LedgerSummary(ledger_id=ledger_id, entity=entity, first_txn_id=first_id, last_txn_id=last_id)
+            if last_id:
+                signer_verkey = get_txn_signer_verkey(last_txns[last_id].txn)
+                summary.signer_did = resolve_signer_did(signer_verkey)
+                summary.status = get_txn_status(signer_verkey)
+                summary.approaching = summary.signer_did in approaching_entities
+            summaries.append(summary)
+        LedgerSummary.objects.bulk_create(summaries)
+    if rows:
+        # signals of historical models are not sent, cached ledgers index is dropped explicitly
+        from wrapper.models import invalidate_ledgers_index
+        invalidate_ledgers_index()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wrapper', '0020_ledgersummary_approaching_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
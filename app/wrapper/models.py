@@ -1,14 +1,23 @@
 import os
+import glob
+import time
 import hashlib
 import secrets
+from datetime import timedelta
+from typing import Optional, List, Dict
 
-from django.db import models
+from django.db import models, connection
+from django.utils import timezone
 from django.core.cache import cache
-from django.db.models.signals import pre_save, pre_delete, post_migrate
+from django.db.transaction import on_commit, atomic
+from django.db.models.signals import post_save, post_delete
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.postgres.fields import JSONField, ArrayField
 
+from .utils import get_approaching_entities, get_txn_signer_verkey, resolve_signer_did, get_txn_status, \
+    HashingFile, AssembledFile
+
 
 def import_class(name):
     components = name.split('.')
@@ -48,6 +57,57 @@ class Transaction(models.Model):
         unique_together = ('seq_no', 'ledger')
 
 
+class LedgerSummary(models.Model):
+    """Denormalized projection of ledger state, maintained on every ledger write
+
+    Ledgers without transactions (empty genesis) have summary with null last_txn and are not listed,
+    they appear in ledgers list with first stored transaction.
+    """
+    ledger = models.OneToOneField(Ledger, on_delete=models.CASCADE, related_name='summary')
+    entity = models.CharField(max_length=64, db_index=True, null=True)
+    first_txn = models.ForeignKey(Transaction, on_delete=models.SET_NULL, null=True, related_name='+')
+    last_txn = models.ForeignKey(Transaction, on_delete=models.SET_NULL, null=True, related_name='+')
+    signer_did = models.CharField(max_length=64, db_index=True, null=True)
+    status = models.CharField(max_length=36, db_index=True, null=True)
+    approaching = models.BooleanField(default=False, db_index=True)
+    updated = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # approaching ledgers of entity are counted and listed on every UI page
+            models.Index(fields=['entity', 'approaching']),
+        ]
+
+    @staticmethod
+    def refresh(ledger: Ledger) -> 'LedgerSummary':
+        """Recalculate summary for ledger, call it inside same db transaction that stores ledger transactions
+
+        Summary row is locked before transactions are read, so concurrent commits to same ledger
+        are serialized and the last one sees transactions of all others.
+        """
+        with atomic():
+            LedgerSummary.objects.get_or_create(ledger=ledger, defaults={'entity': ledger.entity})
+            summary = LedgerSummary.objects.select_for_update().get(ledger=ledger)
+            was_listed = summary.last_txn_id is not None
+            summary.entity = ledger.entity
+            summary.first_txn = ledger.transaction_set.first()
+            summary.last_txn = ledger.transaction_set.last()
+            if summary.last_txn:
+                signer_verkey = get_txn_signer_verkey(summary.last_txn.txn)
+                summary.signer_did = resolve_signer_did(signer_verkey)
+                summary.status = get_txn_status(signer_verkey)
+                summary.approaching = summary.signer_did in get_approaching_entities()
+            else:
+                summary.signer_did = None
+                summary.status = None
+                summary.approaching = False
+            summary.save()
+            if was_listed != (summary.last_txn_id is not None):
+                # ledgers index contains listed ledgers only
+                invalidate_ledger_cache(ledger.id, reindex=True)
+        return summary
+
+
 class GURecord(models.Model):
     entity = models.CharField(max_length=64, db_index=True)
     category = models.CharField(max_length=36, db_index=True)
@@ -85,7 +145,8 @@ class Content(models.Model):
     delete_after_download = models.BooleanField(default=False, db_index=True)
     encoded = models.BooleanField(default=False, db_index=True)
     download_counter = models.IntegerField(default=0, db_index=True)
-    md5 = models.CharField(max_length=128, null=True)
+    md5 = models.CharField(max_length=128, null=True, db_index=True)
+    ref_count = models.IntegerField(default=1)
 
     @property
     def url(self):
@@ -95,51 +156,346 @@ class Content(models.Model):
         cls = import_class(self.storage)
         return cls()
 
-    def set_file(self, file):
+    def set_file(self, file, md5: str):
+        """Save file to storage, digest was calculated while file was received"""
         self.name = file.name
         self.content_type = file.content_type
         _, ext = os.path.splitext(file.name.lower())
         self.id = secrets.token_hex(16)
         self.uid = self.id + ext
         self.get_storage_instance().save(self.uid, file)
-        file.seek(0)
-        content = file.read()
-        self.md5 = hashlib.md5(content).hexdigest()
+        self.md5 = md5
         self.entity = settings.AGENT['entity']
         pass
 
+    @staticmethod
+    def store(file, md5: str = None) -> 'Content':
+        """Store uploaded file, if content with same digest was stored earlier it is referenced instead.
+
+        Upload without known digest is read once: it is hashed while streamed to local file
+        that is moved to storage for new content and removed for duplicate.
+        Call it inside db transaction.
+        """
+        received_path = None
+        if md5 is None:
+            file, md5 = Content.receive(file)
+            received_path = file.temporary_file_path()
+        try:
+            entity = settings.AGENT['entity']
+            Content.lock_digest(entity, md5)
+            existing = Content.objects.select_for_update().filter(md5=md5, entity=entity).first()
+            if existing:
+                existing.ref_count = models.F('ref_count') + 1
+                # blob is not changed, so 'updated' (Last-Modified of content) is kept
+                existing.save(update_fields=['ref_count'])
+                existing.refresh_from_db(fields=['ref_count'])
+                return existing
+            else:
+                content = Content()
+                content.set_file(file, md5)
+                content.save()
+                return content
+        finally:
+            # storage moved received file for new content
+            if received_path and os.path.exists(received_path):
+                os.remove(received_path)
+
+    @staticmethod
+    def receive(file) -> (AssembledFile, str):
+        """Stream upload to local file next to storage calculating digest on the fly
+
+        :return: received file that storage moves instead of copying, md5 of content
+        """
+        os.makedirs(settings.UPLOAD_SESSIONS_ROOT, exist_ok=True)
+        path = os.path.join(settings.UPLOAD_SESSIONS_ROOT, secrets.token_hex(16) + '.received')
+        hashing_file = HashingFile(file)
+        try:
+            with open(path, 'wb') as f:
+                for chunk in hashing_file.chunks():
+                    f.write(chunk)
+        except:
+            os.remove(path)
+            raise
+        return AssembledFile(path, file.name, file.content_type), hashing_file.md5
+
+    @staticmethod
+    def lock_digest(entity: str, md5: str):
+        """Serialize transactions storing content with same digest until commit
+
+        Row lock can't help when there is no row with this digest yet, so concurrent uploads
+        of same file would both miss it. Postgres advisory lock is taken instead.
+        """
+        if connection.vendor != 'postgresql':
+            return
+        key = int(hashlib.md5(('%s:%s' % (entity, md5)).encode()).hexdigest()[:15], 16)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [key])
+
     def delete(self, using=None, keep_parents=False):
+        with atomic():
+            locked = Content.objects.select_for_update().filter(uid=self.uid).first()
+            if locked and locked.ref_count > 1:
+                # blob is shared with other uploads
+                locked.ref_count = models.F('ref_count') - 1
+                locked.save(update_fields=['ref_count'])
+                return
+            try:
+                self.get_storage_instance().delete(self.uid)
+            except NotImplementedError:
+                pass
+            super().delete(using, keep_parents)
+
+
+_upload_hashers = {}
+
+
+class UploadSession(models.Model):
+    """Resumable upload, file is received by chunks and stored as Content when finalized"""
+    uid = models.CharField(max_length=128, primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    entity = models.CharField(max_length=1024, null=True, db_index=True)
+    name = models.CharField(max_length=512)
+    content_type = models.CharField(max_length=1024, null=True)
+    size = models.BigIntegerField(null=True)
+    offset = models.BigIntegerField(default=0)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True, db_index=True)
+
+    @property
+    def path(self) -> str:
+        return os.path.join(settings.UPLOAD_SESSIONS_ROOT, self.uid + '.part')
+
+    @staticmethod
+    def allocate(user: User, name: str, content_type: str = None, size: int = None) -> 'UploadSession':
+        os.makedirs(settings.UPLOAD_SESSIONS_ROOT, exist_ok=True)
+        inst = UploadSession.objects.create(
+            uid=secrets.token_hex(16),
+            user=user,
+            entity=settings.AGENT['entity'],
+            name=name,
+            content_type=content_type,
+            size=size
+        )
+        open(inst.path, 'wb').close()
+        return inst
+
+    @staticmethod
+    def purge_expired():
+        expired_stamp = timezone.now() - timedelta(seconds=settings.UPLOAD_SESSION_TTL)
+        for session in UploadSession.objects.filter(updated__lt=expired_stamp).all():
+            session.delete()
+
+    def receive(self, stream) -> str:
+        """Save chunk from stream to separate file, db lock is not needed while client sends chunk
+
+        :return: path of received chunk, pass it to write() and remove it after
+        """
+        path = '%s.%s' % (self.path, secrets.token_hex(8))
+        received = 0
         try:
-            self.get_storage_instance().delete(self.uid)
-        except NotImplementedError:
-            pass
+            with open(path, 'wb') as f:
+                while True:
+                    chunk = stream.read(settings.CONTENT_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    received += len(chunk)
+                    if self.size is not None and self.offset + received > self.size:
+                        raise ValueError('Chunk exceeds declared upload size')
+                    f.write(chunk)
+        except:
+            os.remove(path)
+            raise
+        return path
+
+    def write(self, stream, offset: int) -> int:
+        """Append chunk from stream at offset, call it inside db transaction for locked session
+
+        :return: count of written bytes
+        """
+        assert offset == self.offset, 'Unexpected offset'
+        hasher = self.__get_hasher()
+        written = 0
+        with open(self.path, 'r+b') as f:
+            f.seek(offset)
+            while True:
+                chunk = stream.read(settings.CONTENT_CHUNK_SIZE)
+                if not chunk:
+                    break
+                if self.size is not None and offset + written + len(chunk) > self.size:
+                    raise ValueError('Chunk exceeds declared upload size')
+                f.write(chunk)
+                hasher.update(chunk)
+                written += len(chunk)
+            # drop tail that could be left by interrupted request
+            f.truncate()
+        self.offset += written
+        self.save()
+        _upload_hashers[self.uid] = (self.offset, hasher)
+        return written
+
+    def finalize(self) -> Content:
+        """Store received file as Content without re-reading it, call it inside db transaction"""
+        md5 = self.__get_hasher().hexdigest()
+        content = Content.store(
+            AssembledFile(self.path, self.name, self.content_type), md5=md5
+        )
+        self.delete()
+        return content
+
+    @property
+    def md5(self) -> str:
+        return self.__get_hasher().hexdigest()
+
+    def delete(self, using=None, keep_parents=False):
+        _upload_hashers.pop(self.uid, None)
+        # chunks left by interrupted requests too
+        for path in [self.path] + glob.glob(self.path + '.*'):
+            if os.path.exists(path):
+                os.remove(path)
         super().delete(using, keep_parents)
 
+    def __get_hasher(self):
+        offset, hasher = _upload_hashers.get(self.uid, (None, None))
+        if offset != self.offset:
+            # process was restarted or chunk was received by other process, hash received part again
+            hasher = hashlib.md5()
+            remain = self.offset
+            with open(self.path, 'rb') as f:
+                while remain > 0:
+                    chunk = f.read(min(settings.CONTENT_CHUNK_SIZE, remain))
+                    if not chunk:
+                        break
+                    hasher.update(chunk)
+                    remain -= len(chunk)
+            _upload_hashers[self.uid] = (self.offset, hasher)
+        return hasher.copy()
+
 
 class Token(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     created = models.DateTimeField(auto_now_add=True)
     value = models.CharField(max_length=128, db_index=True)
     entity = models.CharField(max_length=1024, db_index=True)
+    expires = models.DateTimeField(null=True, db_index=True)
 
     @staticmethod
     def allocate(user: User):
-        inst = Token.objects.create(
+        """Reuse valid token of user if it lives at least half of TTL, allocate new one otherwise"""
+        now = timezone.now()
+        inst = Token.objects.filter(
             user=user,
-            value=secrets.token_hex(16),
-            entity=settings.AGENT['entity']
-        )
+            entity=settings.AGENT['entity'],
+            expires__gt=now + timedelta(seconds=settings.TOKEN_TTL // 2)
+        ).order_by('-expires').first()
+        if inst is None:
+            inst = Token.objects.create(
+                user=user,
+                value=secrets.token_hex(16),
+                entity=settings.AGENT['entity'],
+                expires=now + timedelta(seconds=settings.TOKEN_TTL)
+            )
+            inst.cache()
         return inst
 
+    @staticmethod
+    def load(value: str) -> Optional[float]:
+        """Expiration timestamp of valid token, None if token is unknown or expired"""
+        expires = cache.get(get_token_cache_key(value))
+        if expires is None:
+            inst = Token.objects.filter(
+                entity=settings.AGENT['entity'], value=value, expires__gt=timezone.now()
+            ).first()
+            if inst is None:
+                return None
+            expires = inst.cache()
+        return expires if expires > time.time() else None
+
+    @staticmethod
+    def purge_expired() -> int:
+        deleted, _ = Token.objects.filter(
+            models.Q(expires__lte=timezone.now()) | models.Q(expires__isnull=True)
+        ).delete()
+        return deleted
+
+    def cache(self) -> float:
+        expires = self.expires.timestamp()
+        timeout = int(expires - time.time())
+        if timeout > 0:
+            cache.set(get_token_cache_key(self.value), expires, timeout)
+        return expires
+
+
+def get_token_cache_key(value: str) -> str:
+    return 'tokens:%s' % value
+
+
+def get_ledgers_index_key() -> str:
+    version = cache.get_or_set(settings.LEDGERS_CACHE_KEY + ':version', int(time.time()), None)
+    return '%s:index:%s' % (settings.LEDGERS_CACHE_KEY, version)
+
+
+def get_ledger_version_key(ledger_id: int) -> str:
+    return '%s:ledger:%s:version' % (settings.LEDGERS_CACHE_KEY, ledger_id)
+
+
+def get_ledger_cache_keys(ledger_ids: List[int]) -> Dict[int, str]:
+    """Versioned cache keys of ledgers records.
+
+    Invalidation bumps version, so record built from database before commit and stored after
+    invalidation lands under outdated key and is never read.
+    """
+    version_keys = {get_ledger_version_key(ledger_id): ledger_id for ledger_id in ledger_ids}
+    versions = cache.get_many(list(version_keys.keys()))
+    missing = [key for key in version_keys.keys() if key not in versions]
+    for key in missing:
+        # version key was evicted, start from random value to skip stale records
+        cache.add(key, secrets.randbelow(2 ** 62), None)
+    if missing:
+        versions.update(cache.get_many(missing))
+    return {
+        ledger_id: '%s:ledger:%s:%s' % (settings.LEDGERS_CACHE_KEY, ledger_id, versions.get(key))
+        for key, ledger_id in version_keys.items()
+    }
+
+
+def invalidate_ledgers_index():
+    try:
+        cache.incr(settings.LEDGERS_CACHE_KEY + ':version')
+    except ValueError:
+        # version key was evicted, start from unique value to skip stale indexes
+        cache.set(settings.LEDGERS_CACHE_KEY + ':version', int(time.time()), None)
+
+
+def invalidate_ledger_cache(ledger_id: int, reindex: bool = False):
+    """Drop cached entry of single ledger after current db transaction is committed"""
+
+    def invalidate():
+        try:
+            cache.incr(get_ledger_version_key(ledger_id))
+        except ValueError:
+            cache.set(get_ledger_version_key(ledger_id), secrets.randbelow(2 ** 62), None)
+        if reindex:
+            invalidate_ledgers_index()
+
+    on_commit(invalidate)
+
+
+def clear_ledger_caches(instance: Ledger, *args, **kwargs):
+    invalidate_ledger_cache(instance.id)
+
+
+def clear_txn_caches(instance: Transaction, *args, **kwargs):
+    invalidate_ledger_cache(instance.ledger_id)
+
 
-def clear_txn_caches(instance, *args, **kwargs):
-    cache.delete(settings.INBOX_CACHE_KEY)
-    cache.delete(settings.LEDGERS_CACHE_KEY)
+def clear_summary_caches(instance: LedgerSummary, created: bool = True, *args, **kwargs):
+    # new summaries or deleted ones change the set of ledgers so index should be rebuilt
+    invalidate_ledger_cache(instance.ledger_id, reindex=created)
 
 
-pre_save.connect(clear_txn_caches, sender=Ledger)
-pre_save.connect(clear_txn_caches, sender=Transaction)
-pre_delete.connect(clear_txn_caches, sender=Ledger)
-pre_delete.connect(clear_txn_caches, sender=Transaction)
-post_migrate.connect(clear_txn_caches, sender=Ledger)
-post_migrate.connect(clear_txn_caches, sender=Transaction)
+post_save.connect(clear_ledger_caches, sender=Ledger)
+post_save.connect(clear_txn_caches, sender=Transaction)
+post_save.connect(clear_summary_caches, sender=LedgerSummary)
+post_delete.connect(clear_ledger_caches, sender=Ledger)
+post_delete.connect(clear_txn_caches, sender=Transaction)
+post_delete.connect(clear_summary_caches, sender=LedgerSummary)
@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import weakref
+from typing import Dict, List, Set, Optional
+
+from django.conf import settings
+from channels.db import database_sync_to_async
+
+from scripts.management.commands.notify_pairwise import Command as NotifyCommand
+
+
+class NotificationDispatcher:
+    """Deliver events to subscribed pairwises in background.
+
+    Events enqueued during coalesce window are joined into single digest. While subscriber
+    didn't answer previous question, new events are accumulated in its inbox and delivered by next digest.
+    """
+
+    def __init__(self, window: float, concurrency: int):
+        self.__window = window
+        self.__semaphore = asyncio.Semaphore(concurrency)
+        self.__pending: List[str] = []
+        self.__flusher: Optional[asyncio.Future] = None
+        self.__inboxes: Dict[str, List[str]] = {}
+        self.__active: Set[str] = set()
+        self.__counters = dict(enqueued=0, digests=0, errors=0)
+
+    def enqueue(self, message: str):
+        self.__pending.append(message)
+        self.__counters['enqueued'] += 1
+        if self.__flusher is None or self.__flusher.done():
+            self.__flusher = asyncio.ensure_future(self.__flush_later())
+
+    def metrics(self) -> dict:
+        return dict(
+            pending=len(self.__pending),
+            active=len(self.__active),
+            queued=sum(len(inbox) for inbox in self.__inboxes.values()),
+            **self.__counters
+        )
+
+    async def __flush_later(self):
+        # events enqueued while flushing don't schedule new flusher, so flush until nothing is pending
+        while True:
+            await asyncio.sleep(self.__window)
+            messages, self.__pending = self.__pending, []
+            if not messages:
+                return
+            try:
+                dids = await database_sync_to_async(NotifyCommand.load_subscribers)()
+            except Exception as e:
+                self.__counters['errors'] += 1
+                logging.error('Notifications: exception while loading subscribers: ' + repr(e))
+                continue
+            for did in dids:
+                self.__inboxes.setdefault(did, []).extend(messages)
+                if did not in self.__active:
+                    self.__active.add(did)
+                    asyncio.ensure_future(self.__deliver(did))
+
+    async def __deliver(self, their_did: str):
+        try:
+            while self.__inboxes.get(their_did):
+                messages = self.__inboxes.pop(their_did)
+                async with self.__semaphore:
+                    try:
+                        await NotifyCommand.notify(their_did, self.build_digest(messages))
+                        self.__counters['digests'] += 1
+                    except Exception as e:
+                        self.__counters['errors'] += 1
+                        logging.error('Notifications: exception while notify %s: %s' % (their_did, repr(e)))
+        finally:
+            self.__active.discard(their_did)
+
+    @staticmethod
+    def build_digest(messages: List[str]) -> str:
+        if len(messages) == 1:
+            return messages[0]
+        else:
+            return 'Новых событий: %d\n' % len(messages) + '\n'.join(messages)
+
+
+_dispatchers = weakref.WeakKeyDictionary()
+
+
+def get_notification_dispatcher() -> NotificationDispatcher:
+    """Dispatcher of current event loop"""
+    loop = asyncio.get_event_loop()
+    if loop not in _dispatchers:
+        _dispatchers[loop] = NotificationDispatcher(
+            window=settings.NOTIFICATIONS_COALESCE_WINDOW,
+            concurrency=settings.NOTIFICATIONS_CONCURRENCY
+        )
+    return _dispatchers[loop]
+
+
+def get_notification_dispatchers_metrics() -> List[dict]:
+    return [dispatcher.metrics() for dispatcher in list(_dispatchers.values())]
@@ -0,0 +1,206 @@
+import time
+import asyncio
+import logging
+import weakref
+from contextlib import asynccontextmanager
+from typing import Optional, List, Tuple
+
+from django.conf import settings
+from sirius_sdk import Agent, P2PConnection
+
+
+def alloc_agent_connection(credentials: dict = None) -> Agent:
+    credentials = credentials or settings.AGENT
+    agent = Agent(
+        server_address=credentials['server_address'],
+        credentials=credentials['credentials'].encode('ascii'),
+        p2p=P2PConnection(
+            my_keys=(
+                credentials['my_verkey'],
+                credentials['my_secret_key']
+            ),
+            their_verkey=credentials['agent_verkey']
+        )
+    )
+    return agent
+
+
+class AgentPoolBusy(asyncio.TimeoutError):
+    """All connections of pool are in use longer than caller agreed to wait"""
+
+
+class AgentPool:
+    """Bounded pool of opened Agent connections.
+
+    Agent connection is bound to event loop it was opened in, so every loop has own pool,
+    see get_agent_pool(). Connection is owned exclusively by one coroutine between acquire and release:
+    RPC responses are read from shared tunnel, so connection can't serve concurrent calls.
+    """
+
+    def __init__(self, credentials: dict, max_size: int, idle_timeout: float, health_check_interval: float):
+        self.__credentials = credentials
+        self.__max_size = max_size
+        self.__idle_timeout = idle_timeout
+        self.__health_check_interval = health_check_interval
+        self.__semaphore = asyncio.Semaphore(max_size)
+        self.__idle: List[Tuple[Agent, float]] = []
+        self.__size = 0
+        self.__waiting = 0
+        self.__counters = dict(opened=0, closed=0, acquired=0, reused=0, busy=0, health_check_failures=0, errors=0)
+        self.__wait_time = 0.0
+
+    @property
+    def size(self) -> int:
+        return self.__size
+
+    async def acquire(self, timeout: float = None) -> Agent:
+        stamp = time.monotonic()
+        self.__waiting += 1
+        try:
+            await asyncio.wait_for(self.__semaphore.acquire(), timeout)
+        except asyncio.TimeoutError:
+            self.__counters['busy'] += 1
+            raise AgentPoolBusy()
+        finally:
+            self.__waiting -= 1
+            self.__wait_time += time.monotonic() - stamp
+        try:
+            self.__counters['acquired'] += 1
+            agent = await self.__pop_idle()
+            if agent is None:
+                agent = alloc_agent_connection(self.__credentials)
+                await agent.open()
+                self.__size += 1
+                self.__counters['opened'] += 1
+            return agent
+        except:
+            self.__semaphore.release()
+            raise
+
+    async def release(self, agent: Agent, discard: bool = False):
+        try:
+            if discard or not agent.is_open:
+                await self.__discard(agent)
+            else:
+                self.__idle.append((agent, time.monotonic()))
+            await self.__evict_idle()
+        finally:
+            self.__semaphore.release()
+
+    @asynccontextmanager
+    async def connection(self, timeout: float = None):
+        agent = await self.acquire(timeout)
+        try:
+            yield agent
+        except:
+            # connection state is unknown after failure, don't give it to others
+            self.__counters['errors'] += 1
+            await self.release(agent, discard=True)
+            raise
+        else:
+            await self.release(agent)
+
+    async def close(self):
+        while self.__idle:
+            agent, _ = self.__idle.pop()
+            await self.__discard(agent)
+
+    def metrics(self) -> dict:
+        acquired = self.__counters['acquired']
+        return dict(
+            size=self.__size,
+            max_size=self.__max_size,
+            idle=len(self.__idle),
+            in_use=self.__size - len(self.__idle),
+            waiting=self.__waiting,
+            avg_wait_ms=round(1000 * self.__wait_time / acquired, 2) if acquired else 0,
+            **self.__counters
+        )
+
+    async def __pop_idle(self) -> Optional[Agent]:
+        await self.__evict_idle()
+        while self.__idle:
+            agent, released_at = self.__idle.pop()
+            if agent.is_open:
+                if time.monotonic() - released_at < self.__health_check_interval:
+                    self.__counters['reused'] += 1
+                    return agent
+                elif await self.__is_healthy(agent):
+                    self.__counters['reused'] += 1
+                    return agent
+            await self.__discard(agent)
+        return None
+
+    async def __is_healthy(self, agent: Agent) -> bool:
+        try:
+            ok = await asyncio.wait_for(agent.ping(), self.__health_check_interval)
+        except Exception as e:
+            logging.error('Agent pool: health check failed with exception: ' + repr(e))
+            ok = False
+        if not ok:
+            self.__counters['health_check_failures'] += 1
+        return ok is True
+
+    async def __evict_idle(self):
+        now = time.monotonic()
+        expired = [item for item in self.__idle if now - item[1] >= self.__idle_timeout]
+        if expired:
+            self.__idle = [item for item in self.__idle if now - item[1] < self.__idle_timeout]
+            for agent, _ in expired:
+                await self.__discard(agent)
+
+    async def __discard(self, agent: Agent):
+        self.__size -= 1
+        self.__counters['closed'] += 1
+        try:
+            await agent.close()
+        except Exception as e:
+            logging.error('Agent pool: exception while closing connection: ' + repr(e))
+
+
+_pools = weakref.WeakKeyDictionary()
+
+
+def get_agent_pool(credentials: dict = None) -> AgentPool:
+    """Pool of current event loop for credentials (settings.AGENT by default)"""
+    credentials = credentials or settings.AGENT
+    key = (
+        credentials['server_address'], credentials['credentials'],
+        credentials['my_verkey'], credentials['agent_verkey']
+    )
+    loop = asyncio.get_event_loop()
+    pools = _pools.setdefault(loop, {})
+    if key not in pools:
+        pools[key] = AgentPool(
+            credentials=credentials,
+            max_size=settings.AGENT_POOL_SIZE,
+            idle_timeout=settings.AGENT_POOL_IDLE_TIMEOUT,
+            health_check_interval=settings.AGENT_POOL_HEALTH_CHECK_INTERVAL
+        )
+    return pools[key]
+
+
+def get_agent_pools_metrics() -> List[dict]:
+    metrics = []
+    for loop, pools in list(_pools.items()):
+        for pool in pools.values():
+            metrics.append(pool.metrics())
+    return metrics
+
+
+@asynccontextmanager
+async def get_connection():
+    """Pooled agent connection, don't subscribe to events through it"""
+    async with get_agent_pool().connection() as agent:
+        yield agent
+
+
+@asynccontextmanager
+async def get_dedicated_connection():
+    """Own agent connection for long-living listeners"""
+    agent = alloc_agent_connection()
+    await agent.open()
+    try:
+        yield agent
+    finally:
+        await agent.close()
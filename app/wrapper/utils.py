@@ -1,6 +1,10 @@
 import hashlib
+from types import MappingProxyType
+from functools import lru_cache
+from typing import Optional, List, Mapping, Tuple, Iterator
 
 from django.conf import settings
+from django.core.files import File
 from sirius_sdk import Agent
 from sirius_sdk.agent.microledgers import MicroledgerList
 
@@ -19,3 +23,142 @@ def get_agent_microledgers(agent: Agent) -> MicroledgerList:
     else:
         ml = agent.microledgers
     return ml
+
+
+def get_my_path_index() -> int:
+    try:
+        my_index = settings.TMTM_PATH.index(settings.AGENT['entity'])
+        if settings.PATH_INDEX is not None:
+            my_index = settings.PATH_INDEX
+    except ValueError:
+        my_index = -1
+    return my_index
+
+
+def get_approaching_entities() -> List[str]:
+    """Entities whose containers are approaching to us, see settings.TMTM_PREV_ENTITIES"""
+    my_index = get_my_path_index()
+    if my_index > 0:
+        my_position = settings.TMTM_PATH[my_index]
+        return list(settings.TMTM_PREV_ENTITIES.get(my_position, [settings.TMTM_PATH[my_index - 1]]))
+    else:
+        return []
+
+
+def get_txn_signer_verkey(txn: dict) -> Optional[str]:
+    return txn.get('msg~sig', {}).get('signer', None)
+
+
+class ParticipantsIndex:
+    """Immutable verkey -> participant lookup built from settings.PARTICIPANTS_META"""
+
+    def __init__(self, participants_meta: dict):
+        self.__dids = MappingProxyType(
+            {meta['verkey']: did for did, meta in participants_meta.items()}
+        )
+        self.__meta = MappingProxyType(
+            {did: MappingProxyType(dict(meta)) for did, meta in participants_meta.items()}
+        )
+
+    def did(self, verkey: Optional[str]) -> Optional[str]:
+        return self.__dids.get(verkey, None) if verkey else None
+
+    def meta(self, verkey: Optional[str]) -> Optional[Mapping]:
+        did = self.did(verkey)
+        return self.__meta[did] if did else None
+
+
+@lru_cache(maxsize=None)
+def get_participants_index() -> ParticipantsIndex:
+    return ParticipantsIndex(settings.PARTICIPANTS_META)
+
+
+def resolve_signer_did(signer_verkey: Optional[str]) -> Optional[str]:
+    return get_participants_index().did(signer_verkey)
+
+
+def get_txn_status(signer_verkey: Optional[str]) -> Optional[str]:
+    if signer_verkey:
+        signer_did = resolve_signer_did(signer_verkey)
+        if signer_did == settings.TMTM_PATH[0]:
+            return 'started'
+        elif signer_did == settings.TMTM_PATH[-1]:
+            return 'finished'
+        else:
+            return 'in_way'
+    else:
+        return None
+
+
+class HashingFile(File):
+    """Proxy of uploaded file that calculates md5 of chunks while they are streamed.
+
+    Chunks are read one by one, so memory is bounded by chunk size. Temporary file path
+    of upload is hidden intentionally: file is read through chunks() only.
+    """
+
+    def __init__(self, file, chunk_size: int = None):
+        super().__init__(file.file, file.name)
+        self.__chunk_size = chunk_size or settings.CONTENT_CHUNK_SIZE
+        self.__md5 = hashlib.md5()
+
+    def chunks(self, chunk_size: int = None):
+        for chunk in super().chunks(chunk_size or self.__chunk_size):
+            self.__md5.update(chunk)
+            yield chunk
+
+    @property
+    def md5(self) -> str:
+        return self.__md5.hexdigest()
+
+
+class AssembledFile(File):
+    """File assembled on local disk, storage moves it instead of copying"""
+
+    def __init__(self, path: str, name: str, content_type: str = None):
+        super().__init__(None, name)
+        self.content_type = content_type
+        self.__path = path
+
+    def temporary_file_path(self) -> str:
+        return self.__path
+
+
+def parse_range_header(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse HTTP Range header with single bytes range
+
+    :return: (first, last) inclusive byte positions, None if header is absent or can't be served as single range
+    :raises ValueError: range is not satisfiable
+    """
+    if not header or not header.startswith('bytes='):
+        return None
+    ranges = header[len('bytes='):].split(',')
+    if len(ranges) != 1:
+        return None
+    first, sep, last = ranges[0].strip().partition('-')
+    if not sep or not (first or last) or (first and not first.isdigit()) or (last and not last.isdigit()):
+        return None
+    if not first:
+        # suffix range: last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError('Range is not satisfiable')
+        return max(size - length, 0), size - 1
+    first = int(first)
+    last = min(int(last), size - 1) if last else size - 1
+    if first >= size or first > last:
+        raise ValueError('Range is not satisfiable')
+    return first, last
+
+
+def read_file_range(path: str, first: int, last: int, chunk_size: int = None) -> Iterator[bytes]:
+    chunk_size = chunk_size or settings.CONTENT_CHUNK_SIZE
+    with open(path, 'rb') as f:
+        f.seek(first)
+        remain = last - first + 1
+        while remain > 0:
+            chunk = f.read(min(chunk_size, remain))
+            if not chunk:
+                break
+            remain -= len(chunk)
+            yield chunk
@@ -1,4 +1,5 @@
 import os
+import calendar
 from datetime import datetime
 from typing import Optional
 
@@ -7,21 +8,32 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.renderers import JSONRenderer
+from rest_framework.pagination import CursorPagination
 from rest_framework_extensions.routers import ExtendedDefaultRouter
 from rest_framework.authentication import BasicAuthentication, SessionAuthentication
 from rest_framework.permissions import IsAuthenticated
 from rest_framework_extensions.mixins import PaginateByMaxMixin, NestedViewSetMixin
 from rest_framework import serializers
 from django_downloadview.shortcuts import sendfile
+from django_downloadview.nginx.response import XAccelRedirectResponse
+from django_downloadview.apache.response import XSendfileResponse
 from django.conf import settings
-from django.db import transaction
-from sirius_sdk import Agent, P2PConnection
-from sirius_sdk.agent.aries_rfc.feature_0048_trust_ping import Ping
-
-from ui.utils import run_async
-from .models import Ledger, Transaction, Content, Token, GURecord
+from django.core.cache import cache
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.db import transaction, connection
+
+from ui.utils import get_scheduler_metrics
+from .models import Ledger, Transaction, Content, Token, GURecord, LedgerSummary, UploadSession
 from .decorators import cross_domain
 from .mixins import ExtendViewSetMixin
+from .pool import get_agent_pools_metrics
+from .notifications import get_notification_dispatchers_metrics
+from .events import get_conn_request_routers_metrics
+from .health import get_agent_health, get_participants_health
+from .utils import get_participants_index, get_txn_signer_verkey, get_txn_status, parse_range_header, \
+    read_file_range
 
 
 # Create your views here.
@@ -30,54 +42,72 @@ class MaintenanceViewSet(viewsets.GenericViewSet):
     renderer_classes = [JSONRenderer]
 
     def get_permissions(self):
-        if self.action == 'check_health':
+        if self.action in ['check_health', 'live', 'ready']:
             return []
         else:
             return [IsAuthenticated()]
 
+    @action(methods=["GET"], detail=False)
+    def live(self, request):
+        """Process is able to serve requests"""
+        return Response(dict(success=True))
+
+    @action(methods=["GET"], detail=False)
+    def ready(self, request):
+        """Database and agent are available"""
+        try:
+            connection.ensure_connection()
+        except Exception as e:
+            return Response(dict(success=False, message='Database is not available: ' + repr(e)), status=503)
+        if settings.AGENT['entity']:
+            agent = get_agent_health()
+            if agent is None or not agent['alive']:
+                return Response(dict(success=False, agent=agent, message='Agent is not available'), status=503)
+        return Response(dict(success=True, message='OK'))
+
     @action(methods=["GET", "POST"], detail=False)
     def check_health(self, request):
-        ping_id = str(datetime.utcnow())
-        run_async(
-            self.participants_trust_ping(ping_id),
-            timeout=15
+        """Agent status and participants reachability recently collected by health monitor"""
+        agent = get_agent_health()
+        participants = get_participants_health()
+        if not settings.AGENT['entity']:
+            # health monitor runs in smart-contracts process only when entity is set
+            success, message = True, 'OK'
+        elif agent is None:
+            success, message = False, 'Agent status is unknown or stale'
+        elif agent['alive'] is not True:
+            success, message = False, 'Agent is not available'
+        elif agent.get('degraded'):
+            success, message = True, 'Agent is busy'
+        else:
+            success, message = True, 'OK'
+        return Response(
+            dict(
+                success=success,
+                message=message,
+                agent=agent,
+                participants=participants,
+                reachable=len([item for item in participants.values() if item['reachable']])
+            ),
+            status=200 if success else 503
         )
-        return Response(dict(success=True, ping_id=ping_id, message='OK'))
 
     @action(methods=["GET", "POST"], detail=False)
     def allocate_token(self, request):
         token = Token.allocate(request.user)
-        return Response({'token': token.value})
-
-    @staticmethod
-    async def participants_trust_ping(ping_id: str):
-        if settings.AGENT['entity']:
-            # extract neighbours
-            neighbours = {did: meta for did, meta in settings.PARTICIPANTS_META.items() if did != settings.AGENT['entity']}
-            agent = Agent(
-                server_address=settings.AGENT['server_address'],
-                credentials=settings.AGENT['credentials'].encode('ascii'),
-                p2p=P2PConnection(
-                    my_keys=(
-                        settings.AGENT['my_verkey'],
-                        settings.AGENT['my_secret_key']
-                    ),
-                    their_verkey=settings.AGENT['agent_verkey']
-                )
+        return Response({'token': token.value, 'expires': token.expires})
+
+    @action(methods=["GET"], detail=False)
+    def metrics(self, request):
+        return Response(
+            dict(
+                agent_pools=get_agent_pools_metrics(),
+                notifications=get_notification_dispatchers_metrics(),
+                conn_requests=get_conn_request_routers_metrics(),
+                smart_contracts=cache.get(settings.SMART_CONTRACTS_METRICS_CACHE_KEY),
+                scheduler=get_scheduler_metrics()
             )
-            print('agent.open()')
-            await agent.open()
-            print('start ping to all')
-            try:
-                for their_did, meta in neighbours.items():
-                    to = await agent.pairwise_list.load_for_did(their_did)
-                    print('ping to: ' + their_did)
-                    await agent.send_to(
-                        message=Ping(comment=ping_id),
-                        to=to
-                    )
-            finally:
-                await agent.close()
+        )
 
 
 def get_txn_date(txn: Transaction) -> int:
@@ -126,41 +156,35 @@ class TransactionSerializer(serializers.ModelSerializer):
         collection = obj.txn['~attach']
         return collection
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.__signers = {}
+
+    def get_signer(self, obj) -> tuple:
+        """Resolve (meta, status) of transaction signer, results are cached for serialization lifetime"""
+        signer_verkey = get_txn_signer_verkey(obj.txn)
+        if signer_verkey not in self.__signers:
+            self.__signers[signer_verkey] = (
+                get_participants_index().meta(signer_verkey),
+                get_txn_status(signer_verkey)
+            )
+        return self.__signers[signer_verkey]
+
     def get_signer_icon(self, obj):
-        signer_verkey = obj.txn.get('msg~sig', {}).get('signer', None)
-        if signer_verkey:
-            for did, item in settings.PARTICIPANTS_META.items():
-                verkey = item['verkey']
-                if verkey == signer_verkey:
-                    icon_url = '/static/logos/%s' % item['icon']
-                    return icon_url
-            return None
+        meta, _ = self.get_signer(obj)
+        if meta:
+            return '/static/logos/%s' % meta['icon']
         else:
             return None
 
     def get_status(self, obj):
-        signer_verkey = obj.txn.get('msg~sig', {}).get('signer', None)
-        if signer_verkey:
-            tmtm_path = settings.TMTM_PATH
-            first_did = tmtm_path[0]
-            last_did = tmtm_path[-1]
-            if signer_verkey == settings.PARTICIPANTS_META[first_did]['verkey']:
-                return 'started'
-            elif signer_verkey == settings.PARTICIPANTS_META[last_did]['verkey']:
-                return 'finished'
-            else:
-                return 'in_way'
-        else:
-            return None
+        _, status = self.get_signer(obj)
+        return status
 
     def get_signer_label(self, obj):
-        signer_verkey = obj.txn.get('msg~sig', {}).get('signer', None)
-        if signer_verkey:
-            for did, item in settings.PARTICIPANTS_META.items():
-                verkey = item['verkey']
-                if verkey == signer_verkey:
-                    return item['organization']
-            return None
+        meta, _ = self.get_signer(obj)
+        if meta:
+            return meta['organization']
         else:
             return None
 
@@ -185,6 +209,13 @@ class LedgerViewSet(
     queryset = Ledger.objects.filter(entity=settings.AGENT['entity']).order_by('-id').all()
 
 
+class TransactionCursorPagination(CursorPagination):
+    """Keyset pagination by seq_no, newest transactions first"""
+    ordering = '-seq_no'
+    page_size_query_param = 'limit'
+    max_page_size = 1000
+
+
 class TransactionViewSet(
             PaginateByMaxMixin, NestedViewSetMixin,
             viewsets.mixins.RetrieveModelMixin,
@@ -206,36 +237,29 @@ class TransactionViewSet(
     @action(methods=['GET', 'POST'], detail=False)
     def list_with_meta(self, request, *args, **kwargs):
         ledger = Ledger.objects.get(id=self.get_ledger())
-        queryset = ledger.transaction_set.order_by('-seq_no').all()
-        serializer = self.get_serializer(queryset, many=True)
-        txn_first = ledger.transaction_set.first()
-        txn_last = ledger.transaction_set.last()
+        queryset = ledger.transaction_set.all()
+        paginator = TransactionCursorPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        summary = LedgerSummary.objects.select_related(
+            'first_txn', 'last_txn'
+        ).filter(ledger=ledger).first() or LedgerSummary.refresh(ledger)
+        txn_first = summary.first_txn
+        txn_last = summary.last_txn
         my_entity = settings.AGENT['entity']
         approaching_days = None
         try:
             if txn_first and txn_last:
                 date_start = get_txn_date(txn_first)
                 date_stop = get_txn_date(txn_last)
-
-                try:
-                    my_index = settings.TMTM_PATH.index(my_entity)
-                    if settings.PATH_INDEX is not None:
-                        my_index = settings.PATH_INDEX
-                except ValueError:
-                    my_index = -1
-                signer_verkey = txn_last.txn.get('msg~sig', {}).get('signer', None)
-                signer_did = [did for did, meta in settings.PARTICIPANTS_META.items() if meta['verkey'] == signer_verkey]
-                signer_did = signer_did[0] if signer_did else None
-                prev_entity = settings.TMTM_PATH[my_index - 1]
-                approaching = signer_did == prev_entity
+                approaching = summary.approaching
 
                 if date_start and date_stop:
                     delta = datetime.today() - date_start
                     days_in_way = delta.days
                     if approaching and settings.TMTM_PATH_TIME[my_entity]:
                         approaching_days = settings.TMTM_PATH_TIME[my_entity] - days_in_way
-                    ser = TransactionSerializer(txn_last)
-                    if ser.data['status'] == 'finished':
+                    if summary.status == 'finished':
                         days_in_way = -1
                 else:
                     days_in_way = None
@@ -245,6 +269,8 @@ class TransactionViewSet(
             days_in_way = None
 
         data = {
+            'next': paginator.get_next_link(),
+            'previous': paginator.get_previous_link(),
             'results': serializer.data,
             'days_in_way': days_in_way,
             'approaching_days': approaching_days
@@ -337,12 +363,106 @@ class UploadView(ExtendViewSetMixin, APIView):
             return Response(b'Expected file value', status=400)
         data = {'url': None, 'md5': None, 'filename': None}
         with transaction.atomic():
-            content = Content()
-            content.set_file(file)
-            content.save()
+            content = Content.store(file)
             data['url'] = self.make_full_url(content.url)
             data['md5'] = content.md5
-            data['filename'] = content.name
+            data['filename'] = file.name
+        return Response(data, status=200)
+
+
+class UploadSessionViewSet(ExtendViewSetMixin, viewsets.GenericViewSet):
+    """Resumable upload: create session, PUT chunks with ?offset=N, finalize with md5"""
+
+    renderer_classes = [JSONRenderer]
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [SessionAuthentication, BasicAuthentication]
+    lookup_field = 'uid'
+
+    def get_queryset(self):
+        return UploadSession.objects.filter(user=self.request.user, entity=settings.AGENT['entity'])
+
+    @staticmethod
+    def build_status(session: UploadSession) -> dict:
+        return {'uid': session.uid, 'name': session.name, 'size': session.size, 'offset': session.offset}
+
+    def create(self, request, *args, **kwargs):
+        name = request.data.get('name', None)
+        if not name:
+            return Response('Expected name value', status=400)
+        size = request.data.get('size', None)
+        if size is not None and not str(size).isdigit():
+            return Response('Size must be non negative integer', status=400)
+        UploadSession.purge_expired()
+        session = UploadSession.allocate(
+            user=request.user,
+            name=name,
+            content_type=request.data.get('content_type', None),
+            size=int(size) if size is not None else None
+        )
+        return Response(self.build_status(session), status=201)
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(self.build_status(self.get_object()))
+
+    def update(self, request, *args, **kwargs):
+        offset = request.query_params.get('offset', '')
+        if not offset.isdigit():
+            return Response('Expected offset value', status=400)
+        stream = request.stream
+        if stream is None:
+            return Response('Expected chunk in request body', status=400)
+        session = self.get_queryset().filter(uid=kwargs['uid']).first()
+        if session is None:
+            return Response('Not Found', status=404)
+        if int(offset) != session.offset:
+            return Response(self.build_status(session), status=409)
+        # chunk is received without lock, so slow client doesn't hold session row
+        try:
+            chunk_path = session.receive(stream)
+        except ValueError as e:
+            return Response(str(e), status=400)
+        try:
+            with transaction.atomic():
+                session = self.get_queryset().select_for_update().filter(uid=kwargs['uid']).first()
+                if session is None:
+                    return Response('Not Found', status=404)
+                if int(offset) != session.offset:
+                    # other request wrote chunk at this offset meanwhile
+                    return Response(self.build_status(session), status=409)
+                try:
+                    with open(chunk_path, 'rb') as chunk:
+                        session.write(chunk, int(offset))
+                except ValueError as e:
+                    return Response(str(e), status=400)
+                return Response(self.build_status(session))
+        finally:
+            if os.path.exists(chunk_path):
+                os.remove(chunk_path)
+
+    def destroy(self, request, *args, **kwargs):
+        self.get_object().delete()
+        return Response(status=204)
+
+    @action(methods=['POST'], detail=True)
+    def finalize(self, request, *args, **kwargs):
+        expected_md5 = request.data.get('md5', None)
+        if not expected_md5:
+            return Response('Expected md5 value', status=400)
+        with transaction.atomic():
+            session = self.get_queryset().select_for_update().filter(uid=kwargs['uid']).first()
+            if session is None:
+                return Response('Not Found', status=404)
+            if session.size is not None and session.offset != session.size:
+                return Response(self.build_status(session), status=409)
+            md5 = session.md5
+            if md5 != expected_md5.lower():
+                return Response({'md5': md5, 'error': 'Digest mismatch'}, status=400)
+            content = session.finalize()
+            data = {
+                'url': self.make_full_url(content.url),
+                'md5': content.md5,
+                'filename': session.name
+            }
         return Response(data, status=200)
 
 
@@ -354,10 +474,55 @@ class ContentView(ExtendViewSetMixin, APIView):
     def get(self, request, uid, *args, **kwargs):
         content = Content.objects.filter(uid=uid, entity=settings.AGENT['entity']).first()
         if content:
-            return sendfile(request, filename=os.path.join(settings.MEDIA_ROOT, content.uid))
+            path = os.path.join(settings.MEDIA_ROOT, content.uid)
+            etag = '"%s"' % content.md5 if content.md5 else None
+            last_modified = calendar.timegm(content.updated.utctimetuple()) if content.updated else None
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = self.build_file_response(request, content, path, etag)
+            if etag:
+                response['ETag'] = etag
+            if last_modified:
+                response['Last-Modified'] = http_date(last_modified)
+            response['Accept-Ranges'] = 'bytes'
+            return response
         else:
             return Response(f'Not Found', status=404)
 
+    @staticmethod
+    def build_file_response(request, content: Content, path: str, etag: Optional[str]):
+        content_type = content.content_type or 'application/octet-stream'
+        # front proxy serves bytes and ranges by itself
+        if settings.CONTENT_OFFLOAD == 'nginx':
+            return XAccelRedirectResponse(
+                redirect_url=settings.CONTENT_OFFLOAD_URL.rstrip('/') + '/' + content.uid,
+                content_type=content_type,
+                attachment=False
+            )
+        elif settings.CONTENT_OFFLOAD == 'apache':
+            return XSendfileResponse(file_path=path, content_type=content_type, attachment=False)
+        range_header = request.META.get('HTTP_RANGE')
+        if_range = request.META.get('HTTP_IF_RANGE')
+        if range_header and os.path.isfile(path) and (not if_range or if_range == etag):
+            size = os.path.getsize(path)
+            try:
+                byte_range = parse_range_header(range_header, size)
+            except ValueError:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = 'bytes */%d' % size
+                return response
+            if byte_range:
+                first, last = byte_range
+                response = StreamingHttpResponse(
+                    read_file_range(path, first, last),
+                    status=206,
+                    content_type=content_type
+                )
+                response['Content-Length'] = str(last - first + 1)
+                response['Content-Range'] = 'bytes %d-%d/%d' % (first, last, size)
+                return response
+        return sendfile(request, filename=path)
+
 
 # Maintenance subsystem
 # URL pattern: /maintenance
@@ -376,3 +541,8 @@ GU11Router = ExtendedDefaultRouter()
 GU11Router.register(r'gu-11', GU11ViewSet, 'gu-11')
 GU12Router = ExtendedDefaultRouter()
 GU12Router.register(r'gu-12', GU12ViewSet, 'gu-12')
+
+# Resumable uploads
+# URL pattern: /uploads
+UploadsRouter = ExtendedDefaultRouter()
+UploadsRouter.register(r'uploads', UploadSessionViewSet, 'uploads')
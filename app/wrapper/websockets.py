@@ -1,26 +1,25 @@
-import os
 import json
+import time
 import uuid
 import logging
 import asyncio
+from collections import OrderedDict
 from typing import Optional, Union
 from datetime import datetime
 from typing import List, Dict
-from contextlib import asynccontextmanager
 from django.conf import settings
 from django.urls import reverse
-from sirius_sdk.messaging import Message
 from django.contrib.auth.models import User as UserModel
 from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
-from sirius_sdk import Agent, P2PConnection, Pairwise, Endpoint
+from sirius_sdk import P2PConnection, Pairwise, Endpoint
 from sirius_sdk.agent.consensus import simple
 from sirius_sdk.agent.microledgers import Transaction
 from sirius_sdk.errors.exceptions import SiriusPromiseContextException
 from sirius_sdk.agent.aries_rfc.utils import sign
 from sirius_sdk.agent.aries_rfc.feature_0095_basic_message import Message as TextMessage
 from sirius_sdk.agent.aries_rfc.feature_0113_question_answer import Question, Answer
-from sirius_sdk.agent.aries_rfc.feature_0160_connection_protocol import Invitation, Inviter, ConnRequest
+from sirius_sdk.agent.aries_rfc.feature_0160_connection_protocol import Invitation, Inviter
 from sirius_sdk.agent.aries_rfc.feature_0036_issue_credential import Issuer, \
     AttribTranslation as IssuerAttribTranslation, ProposedAttrib
 from sirius_sdk.agent.aries_rfc.feature_0037_present_proof import Verifier, \
@@ -33,6 +32,10 @@ from scripts.management.commands.run_smart_contracts import parse_and_store_gu
 from ui.models import QRCode, PairwiseRecord, CredentialQR, AuthRef
 from wrapper.models import UserEntityBind
 from wrapper.utils import get_agent_microledgers
+from wrapper.pool import get_connection, get_dedicated_connection
+from wrapper.notifications import get_notification_dispatcher
+from wrapper.broadcast import broadcast
+from wrapper.events import get_conn_request_router
 from .models import Token
 
 
@@ -40,12 +43,24 @@ REQUEST_ERROR = 'request_error'
 REQUEST_PROCESSING_ERROR = 'request_processing_error'
 
 
-async def load_token(value: str) -> Optional[Token]:
+_tokens_lru: 'OrderedDict[str, float]' = OrderedDict()
 
-    def sync(value_: str) -> Optional[Token]:
-        return Token.objects.filter(entity=settings.AGENT['entity'], value=value).first()
 
-    return await database_sync_to_async(sync)(value)
+async def load_token(value: str) -> bool:
+    """Check token is valid: recently used tokens are checked in process, others in cache and db"""
+    expires = _tokens_lru.get(value)
+    if expires is not None and expires > time.time():
+        _tokens_lru.move_to_end(value)
+        return True
+    expires = await database_sync_to_async(Token.load)(value)
+    if expires is None:
+        _tokens_lru.pop(value, None)
+        return False
+    _tokens_lru[value] = expires
+    _tokens_lru.move_to_end(value)
+    while len(_tokens_lru) > settings.TOKEN_LRU_SIZE:
+        _tokens_lru.popitem(last=False)
+    return True
 
 
 def build_problem_report(problem_code: str, explain: str) -> dict:
@@ -69,31 +84,6 @@ def build_progress_report(progress: float, message: str, done: bool=False) -> di
     return msg
 
 
-def alloc_agent_connection() -> Agent:
-    agent = Agent(
-        server_address=settings.AGENT['server_address'],
-        credentials=settings.AGENT['credentials'].encode('ascii'),
-        p2p=P2PConnection(
-            my_keys=(
-                settings.AGENT['my_verkey'],
-                settings.AGENT['my_secret_key']
-            ),
-            their_verkey=settings.AGENT['agent_verkey']
-        )
-    )
-    return agent
-
-
-@asynccontextmanager
-async def get_connection():
-    agent = alloc_agent_connection()
-    await agent.open()
-    try:
-        yield agent
-    finally:
-        await agent.close()
-
-
 async def create_new_ledger(
         my_did: str, name: str, genesis: List[Transaction], ttl: int, stream_id: str, handler=None
 ) -> int:
@@ -203,15 +193,13 @@ async def commit_transactions(
                     transactions=txns_committed
                 )
             elif isinstance(ledger_name, list):
+                batches = {}
                 for name in ledger_name:
                     ledger = await agent.microledgers.ledger(name)
                     pred_txn_count = len(ledger_txns[name])
                     all_txns = await ledger.get_all_transactions()
-                    txns_committed = all_txns[pred_txn_count:]
-                    await orm.store_transactions(
-                        ledger=name,
-                        transactions=txns_committed
-                    )
+                    batches[name] = all_txns[pred_txn_count:]
+                await orm.store_transactions_batch(batches=batches)
         else:
             if state_machine.problem_report:
                 explain = state_machine.problem_report.explain
@@ -238,8 +226,7 @@ class WsTransactions(AsyncJsonWebsocketConsumer):
                 if '=' in item:
                     key, value = item.split('=')
                     if key.lower() == 'token':
-                        token = await load_token(value)
-                        if token:
+                        if await load_token(value):
                             await self.accept()
                             return
             await self.close()
@@ -280,7 +267,7 @@ class WsTransactions(AsyncJsonWebsocketConsumer):
                     await self.send_json(msg)
                     await self.close()
                     message = 'В системе зарегистрирован новый контейнер %s' % payload['name']
-                    os.system('python /app/manage.py notify_pairwise "%s"' % message)
+                    get_notification_dispatcher().enqueue(message)
                 except Exception as e:
                     if isinstance(e, SiriusPromiseContextException):
                         explain = e.printable
@@ -315,7 +302,7 @@ class WsTransactions(AsyncJsonWebsocketConsumer):
                     await self.send_json(msg)
                     await self.close()
                     message = 'Для контейнера %s зарегистрирована новая операция' % txn['ledger']['name']
-                    os.system('python /app/manage.py notify_pairwise "%s"' % message)
+                    get_notification_dispatcher().enqueue(message)
                 except Exception as e:
                     if isinstance(e, SiriusPromiseContextException):
                         explain = e.printable
@@ -331,12 +318,18 @@ class WsTransactions(AsyncJsonWebsocketConsumer):
                     await self._validate_txn(txn)
                     category = 'gu11' if payload['@type'] == self.TYP_GU11 else 'gu12'
                     await database_sync_to_async(parse_and_store_gu)(txn, category)
-                    await self.broadcast_for_all_participants(txn)
+                    delivery = await self.broadcast_for_all_participants(txn)
+                    failed = [did for did, result in delivery.items() if not result['success']]
+                    if failed:
+                        message = 'Transaction successfully accepted and was broadcast for %d of %d participants, ' \
+                                  'failed: %s' % (len(delivery) - len(failed), len(delivery), ', '.join(failed))
+                    else:
+                        message = 'Transaction successfully accepted and was broadcast for all participants'
                     await self.route_event_to_client(
                         event={
                             'payload': {
                                 'progress': 100,
-                                'message': 'Transaction successfully accepted and was broadcast for all participants'
+                                'message': message
                             }
                         }
                     )
@@ -385,20 +378,8 @@ class WsTransactions(AsyncJsonWebsocketConsumer):
             await self.send_json(msg)
 
     @staticmethod
-    async def broadcast_for_all_participants(txn: dict):
-        async with get_connection() as agent:
-            entity = settings.AGENT['entity']
-            participants_dids = [did for did in settings.PARTICIPANTS_META.keys() if did != entity]
-            for did in participants_dids:
-                to = await agent.pairwise_list.load_for_did(did)
-                if to:
-                    msg = Message(txn)
-                    print(f'============ SEND message to DID: {did}  =======')
-                    print(json.dumps(msg, indent=2, sort_keys=True))
-                    print('================================================')
-                    await agent.send_to(msg, to)
-                else:
-                    print('Empty pairwise for DID: ' + did)
+    async def broadcast_for_all_participants(txn: dict) -> Dict[str, dict]:
+        return await broadcast(txn)
 
     async def _validate_txn(self, txn: dict):
         if txn.get('@type', None) in [self.TYP_GU11, self.TYP_GU12]:
@@ -487,11 +468,10 @@ class WsQRCodeAuth(AsyncJsonWebsocketConsumer):
 
     async def connection_listener(self, connection_key: str, my_endpoint: Endpoint):
         print('connection_key: ' + connection_key)
-        async with get_connection() as agent:
-            assert isinstance(agent, Agent)
-            listener = await agent.subscribe()
-            async for event in listener:
-                if event.recipient_verkey == connection_key and isinstance(event.message, ConnRequest):
+        async with get_conn_request_router().listen(connection_key) as events:
+            async for event in events:
+                # own connection is opened only when user scanned QR code
+                async with get_dedicated_connection() as agent:
                     await self.send_json(
                         {'in_progress': True}
                     )
@@ -673,11 +653,10 @@ class WsQRCredentialsAuth(AsyncJsonWebsocketConsumer):
         print('username: ' + username)
         print('connection_key: ' + connection_key)
         entity = settings.AGENT['entity']
-        async with get_connection() as agent:
-            assert isinstance(agent, Agent)
-            listener = await agent.subscribe()
-            async for event in listener:
-                if event.recipient_verkey == connection_key and isinstance(event.message, ConnRequest):
+        async with get_conn_request_router().listen(connection_key) as events:
+            async for event in events:
+                # own connection is opened only when user scanned QR code
+                async with get_dedicated_connection() as agent:
                     logging.error('============= INVITER: Connection request ==============')
                     logging.error(json.dumps(event, indent=2, sort_keys=True))
                     logging.error('==================================')